@@ -1,8 +1,10 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from backend.cache import invalidate_on_commit, object_scopes, order_scopes
 from backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken
+    Contact, ConfirmEmailToken, ImportJob, FacetCount, OutboxEmail, ShopOrder
 
 
 @admin.register(User)
@@ -23,44 +25,126 @@ class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_staff')
 
 
+class CatalogueCacheAdmin(admin.ModelAdmin):
+    """
+    Сбрасывает кеш ответов каталога при изменении объектов через админку
+    """
+
+    def save_model(self, request, obj, form, change):
+        scopes = object_scopes(type(obj).objects.filter(pk=obj.pk).first()) if change else []
+        super().save_model(request, obj, form, change)
+        invalidate_on_commit([*scopes, *object_scopes(obj)])
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidate_on_commit(object_scopes(form.instance))
+
+    def delete_model(self, request, obj):
+        invalidate_on_commit(object_scopes(obj))
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        invalidate_on_commit([scope for obj in queryset for scope in object_scopes(obj)])
+        super().delete_queryset(request, queryset)
+
+
 @admin.register(Shop)
-class ShopAdmin(admin.ModelAdmin):
+class ShopAdmin(CatalogueCacheAdmin):
     pass
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(CatalogueCacheAdmin):
     pass
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(CatalogueCacheAdmin):
     pass
 
 
 @admin.register(ProductInfo)
-class ProductInfoAdmin(admin.ModelAdmin):
+class ProductInfoAdmin(CatalogueCacheAdmin):
     pass
 
 
 @admin.register(Parameter)
-class ParameterAdmin(admin.ModelAdmin):
+class ParameterAdmin(CatalogueCacheAdmin):
     pass
 
 
 @admin.register(ProductParameter)
-class ProductParameterAdmin(admin.ModelAdmin):
+class ProductParameterAdmin(CatalogueCacheAdmin):
     pass
 
 
+class OrderAdminForm(forms.ModelForm):
+    """
+    Запрещает возвращать отмененный заказ в работу: его товары уже возвращены на склад
+    """
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_state(self):
+        state = self.cleaned_data['state']
+        if self.instance.pk and self.instance.state == 'canceled' and state != 'canceled':
+            raise forms.ValidationError('Отмененный заказ нельзя вернуть в работу, оформите новый заказ')
+        return state
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    pass
+    """
+    Возвращает товары на склад при отмене оформленного заказа
+    """
+    form = OrderAdminForm
+    list_display = ('id', 'user', 'state', 'dt', 'total_sum', 'stock_reserved',)
+    list_filter = ('state',)
+    readonly_fields = ('stock_reserved',)
+    actions = ['cancel_orders']
+
+    def save_model(self, request, obj, form, change):
+        if change and 'state' in form.changed_data and obj.state == 'canceled':
+            if Order.cancel(obj.id):
+                invalidate_on_commit(order_scopes(obj.id))
+            # отметку резерва сняла отмена, не перезаписываем ее значением из формы
+            obj.refresh_from_db(fields=['stock_reserved'])
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Отменить выбранные заказы')
+    def cancel_orders(self, request, queryset):
+        for order_id in queryset.values_list('id', flat=True):
+            if Order.cancel(order_id):
+                invalidate_on_commit(order_scopes(order_id))
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    pass
+    """
+    Пересчитывает заказы магазинов после изменения позиций оформленных заказов
+    """
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ShopOrder.refresh(obj.order_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShopOrder.refresh(obj.order_id)
+
+    def delete_queryset(self, request, queryset):
+        order_ids = set(queryset.values_list('order_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Order.update_total_sum(*order_ids)
+        ShopOrder.refresh(*order_ids)
+
+
+@admin.register(ShopOrder)
+class ShopOrderAdmin(admin.ModelAdmin):
+    list_display = ('order', 'shop', 'state', 'dt', 'total_sum',)
+    list_filter = ('shop', 'state',)
 
 
 @admin.register(Contact)
@@ -71,3 +155,21 @@ class ContactAdmin(admin.ModelAdmin):
 @admin.register(ConfirmEmailToken)
 class ConfirmEmailTokenAdmin(admin.ModelAdmin):
     list_display = ('user', 'key', 'created_at',)
+
+
+@admin.register(FacetCount)
+class FacetCountAdmin(admin.ModelAdmin):
+    list_display = ('shop', 'category', 'parameter', 'value', 'count',)
+    list_filter = ('shop',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('url', 'user', 'state', 'processed', 'created_at', 'finished_at',)
+    list_filter = ('state',)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'state', 'attempts', 'next_attempt_at', 'sent_at',)
+    list_filter = ('state',)
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from backend.metrics import record_cache
+
+
+class TokenCache:
+    """
+    Ограниченный по размеру LRU-кеш токенов с временем жизни записей.
+
+    Кеш хранится в памяти процесса, поэтому изменения, сделанные в других
+    процессах, становятся видны не позже чем через TOKEN_CACHE_TTL секунд.
+
+    Attributes:
+    - hits (int): количество попаданий в кеш.
+    - misses (int): количество промахов.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Возвращает пару (user, token) по ключу токена или None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (monotonic() + settings.TOKEN_CACHE_TTL, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        """
+        Удаляет все токены пользователя.
+        """
+        with self.lock:
+            for key in [key for key, (_, (user, _)) in self.entries.items() if user.pk == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Возвращает счетчики попаданий и промахов и текущий размер кеша.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кешированием пользователя в памяти процесса.
+
+    Запись удаляется из кеша при удалении токена и сохранении пользователя
+    (см. backend.signals), остальные изменения ограничены TOKEN_CACHE_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        record_cache('token', cached is not None)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        # копия, чтобы изменения request.user в обработчике не попали в кеш
+        return copy(user), copy(token)
@@ -0,0 +1,175 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from random import Random
+from threading import Lock
+from time import perf_counter
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+CATEGORY_NAMES = ['Смартфоны', 'Аксессуары', 'Flash-накопители', 'Телевизоры', 'Ноутбуки', 'Планшеты',
+                  'Наушники', 'Мониторы']
+
+COLORS = ['черный', 'белый', 'золотистый', 'серебристый', 'красный', 'синий']
+
+
+def generate_price_list(shop, goods, parameters, categories=4, seed=0):
+    """
+    Строит прайс-лист в формате data/shop1.yaml.
+
+    Товары с одинаковыми номерами в разных магазинах имеют одинаковые название
+    и категорию, поэтому магазины делят общие продукты, как в реальном каталоге.
+
+    Args:
+    - shop (int): номер магазина.
+    - goods (int): количество товаров.
+    - parameters (int): количество параметров у каждого товара.
+    - categories (int): количество категорий.
+    - seed (int): начальное значение генератора случайных чисел.
+
+    Returns:
+    - dict: прайс-лист с ключами shop, categories и goods.
+    """
+    random = Random(f'{seed}:{shop}')
+    category_ids = list(range(1, categories + 1))
+    price_list = {
+        'shop': f'Магазин {shop}',
+        'categories': [{'id': category_id, 'name': CATEGORY_NAMES[category_id - 1]
+                        if category_id <= len(CATEGORY_NAMES) else f'Категория {category_id}'}
+                       for category_id in category_ids],
+        'goods': [],
+    }
+    for number in range(goods):
+        category_id = category_ids[number % categories]
+        price = random.randrange(1000, 200000, 10)
+        item_parameters = {}
+        for index in range(parameters):
+            if index == 0:
+                item_parameters['Цвет'] = random.choice(COLORS)
+            elif index == 1:
+                item_parameters['Встроенная память (Гб)'] = random.choice([32, 64, 128, 256, 512])
+            else:
+                item_parameters[f'Параметр {index}'] = f'значение {random.randrange(10)}'
+        price_list['goods'].append({
+            'id': 1000000 + number,
+            'category': category_id,
+            'model': f'model/{category_id}/{number}',
+            'name': f'{price_list["categories"][category_id - 1]["name"]} модель {number}',
+            'price': price,
+            'price_rrc': price + price // 10,
+            'quantity': random.randrange(0, 100),
+            'parameters': item_parameters,
+        })
+    return price_list
+
+
+def percentile(values, percent):
+    """
+    Перцентиль по методу ближайшего ранга для отсортированного списка.
+    """
+    if not values:
+        return 0
+    return values[max(ceil(percent / 100 * len(values)), 1) - 1]
+
+
+class LoadStats:
+    """
+    Накопитель времени ответа и количества SQL-запросов по эндпоинтам.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = 0
+
+    def record(self, endpoint, latency, queries, ok):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.queries[endpoint].append(queries)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self):
+        """
+        Returns:
+        - list: строки отчета по эндпоинтам: количество запросов, ошибки, запросов
+          в секунду, p50/p95/p99 в миллисекундах и среднее число SQL-запросов.
+        """
+        rows = []
+        for endpoint, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            queries = self.queries[endpoint]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(latencies),
+                'errors': self.errors[endpoint],
+                'rps': len(latencies) / self.elapsed if self.elapsed else 0,
+                'p50': percentile(latencies, 50) * 1000,
+                'p95': percentile(latencies, 95) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'queries': sum(queries) / len(queries),
+            })
+        return rows
+
+
+class LoadClient:
+    """
+    Клиент API, замеряющий время ответа и SQL-запросы каждого вызова.
+
+    Запросы выполняются в процессе через django.test.Client, поэтому сеть не нужна.
+    """
+
+    def __init__(self, token, stats):
+        self.client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Token {token}')
+        self.stats = stats
+
+    def request(self, endpoint, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = getattr(self.client, method)(path, data or {})
+            latency = perf_counter() - start
+        self.stats.record(endpoint, latency, len(queries), self.is_ok(response))
+        return response
+
+    @staticmethod
+    def is_ok(response):
+        # ошибки API возвращаются и с кодом 200, в виде {'Status': False}
+        if response.status_code >= 400:
+            return False
+        if response.get('Content-Type') == 'application/json':
+            data = response.json()
+            return not (isinstance(data, dict) and data.get('Status') is False)
+        return True
+
+
+def run_load(scenario, workers, iterations, stats):
+    """
+    Выполняет сценарий в нескольких потоках, каждый со своим соединением с БД.
+
+    Args:
+    - scenario (callable): scenario(worker, iteration) - одна итерация клиента с номером worker.
+    - workers (int): количество параллельных клиентов.
+    - iterations (int): количество итераций каждого клиента.
+    - stats (LoadStats): статистика, в которую пишут клиенты сценария.
+
+    Returns:
+    - LoadStats: накопленная статистика.
+    """
+
+    def worker(number):
+        try:
+            for iteration in range(iterations):
+                scenario(number, iteration)
+        finally:
+            connection.close()
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(worker, number) for number in range(workers)]:
+            future.result()
+    stats.elapsed = perf_counter() - start
+    return stats
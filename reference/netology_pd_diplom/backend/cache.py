@@ -0,0 +1,177 @@
+from hashlib import md5
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from backend.metrics import record_cache
+from backend.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+
+# версия, общая для всех ответов каталога
+CATALOGUE = 'catalogue'
+# последняя выданная версия среди всех областей каталога
+LAST_VERSION = 'last'
+
+
+def _version_key(scope):
+    return f'catalogue:version:{scope}'
+
+
+def _next_version():
+    """
+    Возвращает новую версию каталога - время в наносекундах, но не раньше следующей
+    секунды после последней выданной версии.
+
+    Last-Modified содержит целые секунды, поэтому без этого изменение в ту же секунду,
+    что и предыдущий ответ, не изменило бы заголовок, и клиент с If-Modified-Since
+    получал бы 304 с устаревшими данными. Если последняя версия вытеснена из кеша,
+    новая версия начинается со следующей секунды.
+    """
+    key = _version_key(LAST_VERSION)
+    last = cache.get(key)
+    now = time_ns()
+    version = (now // 10 ** 9 + 1) * 10 ** 9 if last is None else max(now, (last // 10 ** 9 + 1) * 10 ** 9)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def get_versions(scopes):
+    """
+    Возвращает текущие версии областей каталога.
+
+    Отсутствующая версия инициализируется новой версией (см. _next_version), а не
+    нулем, чтобы после вытеснения ключа из кеша не совпасть с версией старых записей.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        version = _next_version()
+        for key in missing:
+            cache.add(key, version, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*scopes):
+    """
+    Увеличивает версии областей каталога, делая недействительными связанные ответы.
+
+    Новая версия больше всех выданных ранее и попадает в следующую за ними секунду
+    (см. _next_version), поэтому по версиям формируется и заголовок Last-Modified.
+    """
+    version = _next_version()
+    cache.set_many({_version_key(scope): version for scope in scopes}, timeout=None)
+
+
+def shop_scopes(shop_id):
+    """
+    Возвращает области каталога, в которые входят данные магазина.
+    """
+    category_ids = Category.shops.through.objects.filter(shop_id=shop_id).values_list('category_id', flat=True)
+    return ['shops', 'categories', 'products', f'shop:{shop_id}',
+            *[f'category:{category_id}' for category_id in category_ids]]
+
+
+def object_scopes(obj):
+    """
+    Возвращает области каталога, затронутые изменением объекта.
+    """
+    if obj is None:
+        return []
+    if isinstance(obj, Shop):
+        return shop_scopes(obj.id)
+    if isinstance(obj, Category):
+        return ['categories', 'products', f'category:{obj.id}',
+                *[f'shop:{shop_id}' for shop_id in obj.shops.values_list('id', flat=True)]]
+    if isinstance(obj, Product):
+        shop_ids = obj.product_infos.values_list('shop_id', flat=True).distinct()
+        return ['products', f'category:{obj.category_id}', *[f'shop:{shop_id}' for shop_id in shop_ids]]
+    if isinstance(obj, ProductInfo):
+        return ['products', f'shop:{obj.shop_id}', f'category:{obj.product.category_id}']
+    if isinstance(obj, ProductParameter):
+        return object_scopes(obj.product_info)
+    if isinstance(obj, Parameter):
+        return [CATALOGUE]
+    return []
+
+
+def order_scopes(order_id):
+    """
+    Возвращает области каталога товаров заказа: их остатки меняются при оформлении и отмене заказа.
+    """
+    scopes = {'products'}
+    for shop_id, category_id in ProductInfo.objects.filter(ordered_items__order_id=order_id).values_list(
+            'shop_id', 'product__category_id'):
+        scopes.update([f'shop:{shop_id}', f'category:{category_id}'])
+    return list(scopes)
+
+
+def invalidate_on_commit(scopes):
+    """
+    Сбрасывает области каталога после фиксации текущей транзакции, чтобы
+    параллельный запрос не закешировал данные до их записи.
+    """
+    scopes = list(scopes)
+    if scopes:
+        transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def get_cached_response(request, name, scopes, build):
+    """
+    Возвращает данные ответа из кеша или строит и кеширует их.
+
+    Ключ включает полный адрес запроса (с параметрами) и версии областей каталога,
+    поэтому запись перестает использоваться сразу после вызова invalidate.
+
+    Args:
+    - request (Request): запрос.
+    - name (str): имя ответа.
+    - scopes (list): области каталога, от которых зависит ответ.
+    - build (callable): строит данные ответа при промахе кеша.
+
+    Returns:
+    - данные ответа для Response.
+    """
+    versions = get_versions([CATALOGUE, *scopes])
+    url = md5(request.build_absolute_uri().encode()).hexdigest()
+    key = f'catalogue:{name}:{"-".join(map(str, versions))}:{url}'
+    data = cache.get(key)
+    record_cache('catalogue', data is not None)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return data
+
+
+def conditional_response(request, name, scopes, get_response):
+    """
+    Отвечает 304 Not Modified на условный запрос (If-None-Match, If-Modified-Since) к ответу каталога.
+
+    ETag строится по версиям областей каталога, адресу запроса и заголовку Accept,
+    а Last-Modified - по последней версии, поэтому для проверки не нужны ни запросы
+    к базе, ни сериализация: get_response вызывается только если ответ изменился.
+
+    Args:
+    - request (Request): запрос.
+    - name (str): имя ответа.
+    - scopes (list): области каталога, от которых зависит ответ.
+    - get_response (callable): строит ответ.
+
+    Returns:
+    - HttpResponse: ответ get_response с заголовками ETag и Last-Modified или 304.
+    """
+    versions = get_versions([CATALOGUE, *scopes])
+    tag = f'{name}:{"-".join(map(str, versions))}:{request.get_full_path()}:{request.META.get("HTTP_ACCEPT", "")}'
+    etag = f'"{md5(tag.encode()).hexdigest()}"'
+    last_modified = max(versions) // 10 ** 9
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_response()
+        if response.status_code == 200:
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# кеши, данные которых не видны другим процессам
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Воркер celery пишет в кеш ход импорта (ImportJob.set_progress) и версии каталога,
+    а веб-процессы их читают, поэтому при выполнении задач в отдельном процессе кеш должен быть общим.
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER or settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        'Кеш default доступен только текущему процессу, а задачи celery выполняются в отдельном воркере',
+        hint='Используйте общий кеш (FileBasedCache, Redis, Memcached) или CELERY_TASK_ALWAYS_EAGER=True',
+        obj='CACHES',
+        id='backend.E001',
+    )]
@@ -0,0 +1,84 @@
+from django.db.models import Count, Q, Sum
+
+from backend.models import FacetCount, ProductParameter
+
+
+def refresh_facet_counts(shop_id):
+    """
+    Пересчитывает количество активных предложений магазина по значениям параметров.
+
+    Args:
+    - shop_id (int): идентификатор магазина.
+    """
+    rows = ProductParameter.objects.filter(
+        product_info__shop_id=shop_id, product_info__is_active=True).order_by().values(
+        'product_info__product__category_id', 'parameter_id', 'value').annotate(count=Count('id'))
+    FacetCount.objects.filter(shop_id=shop_id).delete()
+    FacetCount.objects.bulk_create([FacetCount(shop_id=shop_id,
+                                               category_id=row['product_info__product__category_id'],
+                                               parameter_id=row['parameter_id'],
+                                               value=row['value'],
+                                               count=row['count']) for row in rows], batch_size=1000)
+
+
+def parse_parameter_filters(values):
+    """
+    Разбирает фильтры вида "Имя параметра:значение".
+
+    Returns:
+    - list: пары (имя параметра, значение).
+    """
+    filters = []
+    for item in values:
+        name, separator, value = item.partition(':')
+        if separator and name and value:
+            filters.append((name, value))
+    return filters
+
+
+def parameter_filter_query(filters):
+    """
+    Строит условие отбора предложений по значениям параметров.
+
+    Каждый фильтр превращается в подзапрос по индексу (parameter, value)
+    вместо отдельного соединения с таблицей параметров.
+    """
+    query = Q()
+    for name, value in filters:
+        query &= Q(id__in=ProductParameter.objects.filter(parameter__name=name, value=value).values('product_info_id'))
+    return query
+
+
+def _group(rows):
+    facets = {}
+    for name, value, count in rows:
+        facets.setdefault(name, {})[value] = count
+    return facets
+
+
+def precomputed_facets(shop_id=None, category_id=None):
+    """
+    Возвращает количество предложений по значениям параметров из предрассчитанного индекса.
+
+    Returns:
+    - dict: {имя параметра: {значение: количество}}.
+    """
+    query = Q(shop__state=True)
+    if shop_id:
+        query &= Q(shop_id=shop_id)
+    if category_id:
+        query &= Q(category_id=category_id)
+    return _group(FacetCount.objects.filter(query).order_by('parameter__name', 'value').values_list(
+        'parameter__name', 'value').annotate(total=Sum('count')))
+
+
+def queryset_facets(queryset):
+    """
+    Возвращает количество предложений по значениям параметров для произвольной выборки.
+
+    Returns:
+    - dict: {имя параметра: {значение: количество}}.
+    """
+    return _group(ProductParameter.objects.filter(
+        product_info_id__in=queryset.order_by().values('id')).order_by('parameter__name', 'value').values_list(
+        'parameter__name', 'value').annotate(total=Count('id')))
@@ -0,0 +1,267 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from backend.cache import invalidate_on_commit, shop_scopes
+from backend.facets import refresh_facet_counts
+from backend.models import Category, Product, ProductInfo, Parameter, ProductParameter
+from backend.search import remove_from_search_index, update_search_index
+
+SYNC_FIELDS = ['product', 'model', 'price', 'price_rrc', 'quantity', 'is_active']
+
+
+def chunked(iterable, size):
+    """
+    Разбивает последовательность на списки длиной не более size
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class PriceListImporter:
+    """
+    Импорт прайс-листа магазина пакетными запросами.
+
+    Справочники категорий, продуктов, параметров и предложений магазина загружаются
+    в словари один раз, после чего товары синхронизируются по external_id через
+    bulk_create/bulk_update пакетами по batch_size строк в одной транзакции.
+
+    Attributes:
+    - shop (Shop): магазин, для которого загружается прайс-лист.
+    - batch_size (int): количество строк в одном пакетном запросе.
+    - progress (callable): вызывается после каждого пакета с числом обработанных товаров.
+    - stats (dict): количество созданных справочников и добавленных, обновленных,
+      неизмененных и снятых с продажи предложений.
+    """
+
+    def __init__(self, shop, batch_size=None, progress=None):
+        self.shop = shop
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.processed = 0
+        self.stats = {
+            'categories': 0,
+            'products': 0,
+            'parameters': 0,
+            'inserted': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'removed': 0,
+        }
+        self.products = {}
+        self.parameters = {}
+        self.offers = {}
+        self.retired = set()
+        self.seen = set()
+
+    def load_lookups(self):
+        """
+        Загружает существующие продукты, параметры и предложения магазина в словари поиска.
+        """
+        self.products = {(name, category_id): pk for pk, name, category_id in
+                         Product.objects.order_by().values_list('id', 'name', 'category_id')}
+        self.parameters = {name: pk for pk, name in Parameter.objects.order_by().values_list('id', 'name')}
+        self.offers, self.retired = {}, set()
+        for pk, external_id, is_active in ProductInfo.objects.filter(shop_id=self.shop.id).values_list(
+                'id', 'external_id', 'is_active'):
+            self.offers[external_id] = pk
+            if not is_active:
+                self.retired.add(pk)
+
+    def import_categories(self, categories):
+        """
+        Создает или обновляет категории прайс-листа и привязывает их к магазину.
+
+        Args:
+        - categories (list): список словарей с ключами id и name.
+        """
+        objects = [Category(id=category['id'], name=category['name']) for category in categories]
+        if not objects:
+            return
+        Category.objects.bulk_create(objects, batch_size=self.batch_size, update_conflicts=True,
+                                     unique_fields=['id'], update_fields=['name'])
+        through = Category.shops.through
+        through.objects.bulk_create([through(category_id=category.id, shop_id=self.shop.id) for category in objects],
+                                    batch_size=self.batch_size, ignore_conflicts=True)
+        self.stats['categories'] += len(objects)
+
+    def _create_products(self, goods):
+        missing = {}
+        for item in goods:
+            key = (item['name'], item['category'])
+            if key not in self.products and key not in missing:
+                missing[key] = Product(name=item['name'], category_id=item['category'])
+        if not missing:
+            return
+        created = Product.objects.bulk_create(missing.values(), batch_size=self.batch_size)
+        if connection.features.can_return_rows_from_bulk_insert:
+            self.products.update({(product.name, product.category_id): product.id for product in created})
+        else:
+            names = {name for name, _ in missing}
+            self.products.update({(name, category_id): pk for pk, name, category_id in
+                                  Product.objects.filter(name__in=names).values_list('id', 'name', 'category_id')})
+        self.stats['products'] += len(missing)
+
+    def _create_parameters(self, goods):
+        missing = {name for item in goods for name in item['parameters'] if name not in self.parameters}
+        if not missing:
+            return
+        created = Parameter.objects.bulk_create([Parameter(name=name) for name in missing],
+                                                batch_size=self.batch_size)
+        if connection.features.can_return_rows_from_bulk_insert:
+            self.parameters.update({parameter.name: parameter.id for parameter in created})
+        else:
+            self.parameters.update(Parameter.objects.filter(name__in=missing).values_list('name', 'id'))
+        self.stats['parameters'] += len(missing)
+
+    def _insert_goods(self, goods):
+        product_infos = ProductInfo.objects.bulk_create(
+            [ProductInfo(product_id=self.products[(item['name'], item['category'])],
+                         external_id=item['id'],
+                         model=item['model'],
+                         price=item['price'],
+                         price_rrc=item['price_rrc'],
+                         quantity=item['quantity'],
+                         shop_id=self.shop.id) for item in goods],
+            batch_size=self.batch_size)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = dict(ProductInfo.objects.filter(
+                shop_id=self.shop.id, external_id__in=[item['id'] for item in goods]).values_list('external_id', 'id'))
+            for product_info in product_infos:
+                product_info.id = ids[product_info.external_id]
+
+        ProductParameter.objects.bulk_create(
+            [ProductParameter(product_info_id=product_info.id,
+                              parameter_id=self.parameters[name],
+                              value=value)
+             for product_info, item in zip(product_infos, goods)
+             for name, value in item['parameters'].items()],
+            batch_size=self.batch_size)
+        self.stats['inserted'] += len(product_infos)
+        return [product_info.id for product_info in product_infos]
+
+    def _sync_goods(self, goods):
+        ids = [self.offers[item['id']] for item in goods]
+        product_infos = {product_info.external_id: product_info for product_info in
+                         ProductInfo.objects.filter(id__in=ids)}
+        parameters = {}
+        for product_parameter in ProductParameter.objects.filter(product_info_id__in=ids):
+            parameters.setdefault(product_parameter.product_info_id, {})[product_parameter.parameter_id] = \
+                product_parameter
+
+        changed_ids, changed_infos, changed_parameters, new_parameters, stale_parameters = [], [], [], [], []
+        for item in goods:
+            product_info = product_infos[item['id']]
+            values = {
+                'product_id': self.products[(item['name'], item['category'])],
+                'model': item['model'],
+                'price': item['price'],
+                'price_rrc': item['price_rrc'],
+                'quantity': item['quantity'],
+                'is_active': True,
+            }
+            changed = False
+            for field, value in values.items():
+                if getattr(product_info, field) != value:
+                    setattr(product_info, field, value)
+                    changed = True
+            if changed:
+                changed_infos.append(product_info)
+
+            current = parameters.get(product_info.id, {})
+            incoming = {self.parameters[name]: str(value) for name, value in item['parameters'].items()}
+            for parameter_id, value in incoming.items():
+                product_parameter = current.get(parameter_id)
+                if product_parameter is None:
+                    new_parameters.append(ProductParameter(product_info_id=product_info.id,
+                                                           parameter_id=parameter_id, value=value))
+                    changed = True
+                elif product_parameter.value != value:
+                    product_parameter.value = value
+                    changed_parameters.append(product_parameter)
+                    changed = True
+            stale = [product_parameter.id for parameter_id, product_parameter in current.items()
+                     if parameter_id not in incoming]
+            if stale:
+                stale_parameters.extend(stale)
+                changed = True
+
+            if changed:
+                changed_ids.append(product_info.id)
+            self.stats['updated' if changed else 'unchanged'] += 1
+
+        ProductInfo.objects.bulk_update(changed_infos, SYNC_FIELDS, batch_size=self.batch_size)
+        ProductParameter.objects.bulk_update(changed_parameters, ['value'], batch_size=self.batch_size)
+        ProductParameter.objects.bulk_create(new_parameters, batch_size=self.batch_size)
+        if stale_parameters:
+            ProductParameter.objects.filter(id__in=stale_parameters).delete()
+        return changed_ids
+
+    def import_goods(self, goods):
+        """
+        Синхронизирует один пакет товаров с предложениями магазина.
+
+        Товары сопоставляются с существующими предложениями по external_id:
+        новые создаются, у найденных обновляются только изменившиеся поля
+        и параметры. Новые и измененные предложения переиндексируются для
+        полнотекстового поиска.
+
+        Args:
+        - goods (list): список словарей товаров в формате прайс-листа.
+        """
+        unique_goods = []
+        for item in goods:
+            if item['id'] not in self.seen:
+                self.seen.add(item['id'])
+                unique_goods.append(item)
+
+        self._create_products(unique_goods)
+        self._create_parameters(unique_goods)
+
+        changed_ids = self._insert_goods([item for item in unique_goods if item['id'] not in self.offers])
+        existing = [item for item in unique_goods if item['id'] in self.offers]
+        if existing:
+            changed_ids += self._sync_goods(existing)
+        update_search_index(changed_ids)
+
+    def retire_missing(self):
+        """
+        Снимает с продажи предложения, отсутствующие в прайс-листе.
+
+        Строки не удаляются, чтобы не затронуть историю заказов.
+        """
+        missing = [pk for external_id, pk in self.offers.items()
+                   if external_id not in self.seen and pk not in self.retired]
+        for ids in chunked(missing, self.batch_size):
+            ProductInfo.objects.filter(id__in=ids).update(is_active=False, quantity=0)
+            remove_from_search_index(ids)
+        self.stats['removed'] += len(missing)
+
+    def run(self, data):
+        """
+        Синхронизирует прайс-лист с предложениями магазина.
+
+        Args:
+        - data (dict): прайс-лист с ключами categories и goods.
+
+        Returns:
+        - dict: количество записанных строк по таблицам.
+        """
+        with transaction.atomic():
+            self.load_lookups()
+            self.import_categories(data['categories'])
+            for goods in chunked(data['goods'], self.batch_size):
+                self.import_goods(goods)
+                self.processed += len(goods)
+                if self.progress:
+                    self.progress(self.processed)
+            self.retire_missing()
+            if self.stats['inserted'] or self.stats['updated'] or self.stats['removed']:
+                refresh_facet_counts(self.shop.id)
+            invalidate_on_commit(shop_scopes(self.shop.id))
+        return self.stats
@@ -0,0 +1,47 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import ProductInfo, Order
+from backend.serializers import ProductInfoSerializer, ProductInfoFastSerializer, OrderSerializer, \
+    OrderFastSerializer
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость сериализаторов DRF и быстрых сериализаторов на загруженных данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help='количество объектов')
+        parser.add_argument('--repeat', type=int, default=5, help='количество повторов')
+
+    def measure(self, serializer_class, objects, repeat):
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            data = serializer_class(objects, many=True).data
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, JSONRenderer().render(data)
+
+    def compare(self, name, objects, serializer_class, fast_serializer_class, repeat):
+        # данные загружаются заранее, чтобы измерялась только сериализация
+        objects = list(objects)
+        slow, expected = self.measure(serializer_class, objects, repeat)
+        fast, rendered = self.measure(fast_serializer_class, objects, repeat)
+        if rendered != expected:
+            raise CommandError(f'{name}: вывод {fast_serializer_class.__name__} отличается от '
+                               f'{serializer_class.__name__}')
+        self.stdout.write(f'{name}: объектов {len(objects)}, DRF {slow * 1000:.1f} мс, '
+                          f'быстрый {fast * 1000:.1f} мс, ускорение x{slow / fast if fast else 0:.1f}')
+
+    def handle(self, *args, **options):
+        limit, repeat = options['limit'], options['repeat']
+        product_infos = ProductInfo.objects.select_related('product__category').prefetch_related(
+            'product_parameters__parameter').order_by('id')[:limit]
+        orders = Order.objects.select_related('contact').prefetch_related(
+            'ordered_items__product_info__product__category',
+            'ordered_items__product_info__product_parameters__parameter')[:limit]
+
+        self.compare('products', product_infos, ProductInfoSerializer, ProductInfoFastSerializer, repeat)
+        self.compare('orders', orders, OrderSerializer, OrderFastSerializer, repeat)
@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand
+from yaml import dump
+
+from backend.benchmark import generate_price_list
+
+
+class Command(BaseCommand):
+    help = 'Генерирует прайс-листы в формате data/shop1.yaml для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shops', type=int, default=1, help='количество магазинов')
+        parser.add_argument('--goods', type=int, default=1000, help='количество товаров в магазине')
+        parser.add_argument('--parameters', type=int, default=4, help='количество параметров товара')
+        parser.add_argument('--categories', type=int, default=4, help='количество категорий')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='.', help='каталог для файлов shopN.yaml')
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output'], exist_ok=True)
+        for shop in range(1, options['shops'] + 1):
+            path = os.path.join(options['output'], f'shop{shop}.yaml')
+            with open(path, 'w', encoding='utf-8') as file:
+                dump(generate_price_list(shop, options['goods'], options['parameters'], options['categories'],
+                                         options['seed']),
+                     file, allow_unicode=True, sort_keys=False)
+            self.stdout.write(path)
@@ -0,0 +1,130 @@
+import json
+import os
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from yaml import dump
+
+from backend.benchmark import LoadClient, LoadStats, generate_price_list, run_load
+from backend.models import User, Contact, ImportJob, ProductInfo, Shop
+from netology_pd_diplom.celery import app as celery_app
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест: загружает сгенерированные прайс-листы через partner/update во временную БД '
+            'и нагружает products, basket, order и partner/orders параллельными клиентами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shops', type=int, default=3, help='количество магазинов')
+        parser.add_argument('--goods', type=int, default=1000, help='количество товаров в магазине')
+        parser.add_argument('--parameters', type=int, default=4, help='количество параметров товара')
+        parser.add_argument('--categories', type=int, default=4, help='количество категорий')
+        parser.add_argument('--workers', type=int, default=4, help='количество параллельных клиентов')
+        parser.add_argument('--iterations', type=int, default=20, help='количество итераций каждого клиента')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help='не удалять тестовую БД после запуска')
+
+    def handle(self, *args, **options):
+        with TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # база в памяти не видна из потоков клиентов, поэтому используем файл
+                if not connection.settings_dict['TEST']['NAME']:
+                    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+                # параллельные транзакции ждут блокировку записи, а не завершаются с database is locked
+                connection.settings_dict['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+                connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+            setup_test_environment()
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+            task_always_eager = celery_app.conf.task_always_eager
+            celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+            try:
+                self.seed(directory, options)
+                self.run(options)
+            finally:
+                celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=task_always_eager)
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+                teardown_test_environment()
+
+    def seed(self, directory, options):
+        for shop in range(1, options['shops'] + 1):
+            with open(os.path.join(directory, f'shop{shop}.yaml'), 'w', encoding='utf-8') as file:
+                dump(generate_price_list(shop, options['goods'], options['parameters'], options['categories'],
+                                         options['seed']),
+                     file, allow_unicode=True, sort_keys=False)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+        Thread(target=server.serve_forever, daemon=True).start()
+        stats = LoadStats()
+        start = perf_counter()
+        try:
+            for shop in range(1, options['shops'] + 1):
+                user = User.objects.create_user(email=f'shop{shop}@example.com', password='password',
+                                                type='shop', is_active=True)
+                client = LoadClient(Token.objects.create(user=user).key, stats)
+                response = client.request('partner/update POST', 'post', reverse('backend:partner-update'),
+                                          {'url': f'http://127.0.0.1:{server.server_port}/shop{shop}.yaml'})
+                job = ImportJob.objects.get(id=response.json()['Job'])
+                if job.state != 'done':
+                    raise CommandError(f'Импорт shop{shop}.yaml: {job.state} {job.errors}')
+        finally:
+            server.shutdown()
+            server.server_close()
+        stats.elapsed = perf_counter() - start
+        self.report('Загрузка прайс-листов', stats)
+
+    def run(self, options):
+        stats = LoadStats()
+        shops = list(Shop.objects.values_list('id', flat=True))
+        categories = list(range(1, options['categories'] + 1))
+        offers = list(ProductInfo.objects.filter(quantity__gt=0).values_list('id', flat=True))
+        partners = [LoadClient(Token.objects.get_or_create(user_id=user_id)[0].key, stats)
+                    for user_id in Shop.objects.values_list('user_id', flat=True)]
+        buyers, contacts, randoms = [], [], []
+        for worker in range(options['workers']):
+            user = User.objects.create_user(email=f'buyer{worker}@example.com', password='password',
+                                            is_active=True)
+            contacts.append(Contact.objects.create(user=user, city='Москва', street='Тверская', phone='+7').id)
+            buyers.append(LoadClient(Token.objects.create(user=user).key, stats))
+            randoms.append(Random(f'{options["seed"]}:{worker}'))
+
+        def scenario(worker, iteration):
+            client, random = buyers[worker], randoms[worker]
+            client.request('products GET', 'get', reverse('backend:products'),
+                           {'shop_id': random.choice(shops), 'category_id': random.choice(categories)})
+            items = [{'product_info': product_info, 'quantity': random.randint(1, 3)}
+                     for product_info in random.sample(offers, min(3, len(offers)))]
+            client.request('basket POST', 'post', reverse('backend:basket'), {'items': json.dumps(items)})
+            basket = client.request('basket GET', 'get', reverse('backend:basket')).json()
+            if basket:
+                client.request('order POST', 'post', reverse('backend:order'),
+                               {'id': str(basket[0]['id']), 'contact': contacts[worker]})
+            client.request('order GET', 'get', reverse('backend:order'))
+            partners[(worker + iteration) % len(partners)].request(
+                'partner/orders GET', 'get', reverse('backend:partner-orders'))
+
+        run_load(scenario, options['workers'], options['iterations'], stats)
+        self.report(f'Нагрузка: клиентов {options["workers"]}, итераций {options["iterations"]}', stats)
+
+    def report(self, title, stats):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{title} ({stats.elapsed:.2f} с)'))
+        self.stdout.write(f'{"эндпоинт":<22}{"запросов":>9}{"ошибок":>8}{"rps":>9}'
+                          f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"SQL":>7}')
+        for row in stats.report():
+            self.stdout.write(f'{row["endpoint"]:<22}{row["requests"]:>9}{row["errors"]:>8}{row["rps"]:>9.1f}'
+                              f'{row["p50"]:>10.1f}{row["p95"]:>10.1f}{row["p99"]:>10.1f}{row["queries"]:>7.1f}')
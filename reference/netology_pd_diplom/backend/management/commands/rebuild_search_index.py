@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from backend.importer import chunked
+from backend.models import ProductInfo
+from backend.search import create_search_index, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс товаров для уже загруженных предложений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        create_search_index()
+        ids = ProductInfo.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+        indexed = 0
+        for batch in chunked(ids.iterator(), options['batch_size']):
+            update_search_index(batch)
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано предложений: {indexed}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.importer import chunked
+from backend.models import Order, ShopOrder
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает заказы магазинов для уже оформленных заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = Order.objects.exclude(state='basket').order_by('id').values_list('id', flat=True)
+        refreshed = 0
+        for batch in chunked(ids.iterator(), options['batch_size']):
+            with transaction.atomic():
+                ShopOrder.refresh(*batch)
+            refreshed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено заказов: {refreshed}'))
@@ -0,0 +1,44 @@
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, \
+    generate_latest, multiprocess
+
+# при заданной переменной окружения PROMETHEUS_MULTIPROC_DIR значения метрик каждого процесса
+# хранятся в файлах этого каталога, а /metrics суммирует их по всем процессам (WSGI-воркерам и celery)
+
+REQUESTS = Counter('http_requests_total', 'Количество HTTP-запросов', ['view', 'method', 'status'])
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                             ['view', 'method'])
+
+IMPORTS = Counter('price_list_imports_total', 'Количество импортов прайс-листов', ['state'])
+IMPORT_DURATION = Histogram('price_list_import_duration_seconds', 'Время импорта прайс-листа', ['state'],
+                            buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float('inf')))
+IMPORT_ROWS = Counter('price_list_import_rows_total',
+                      'Количество строк импорта по видам (см. PriceListImporter.stats)', ['kind'])
+
+EMAILS = Counter('emails_total', 'Количество попыток отправки писем', ['result'])
+EMAIL_SEND_DURATION = Histogram('email_send_duration_seconds', 'Время отправки одного письма')
+
+CACHE_REQUESTS = Counter('cache_requests_total', 'Количество обращений к кешу', ['cache', 'result'])
+
+
+def record_cache(cache, hit):
+    """
+    Учитывает обращение к кешу cache: попадание (hit) или промах.
+    """
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def export():
+    """
+    Формирует метрики в текстовом формате Prometheus.
+
+    Returns:
+    - tuple: (содержимое, тип содержимого).
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,187 @@
+import json
+import logging
+from collections import Counter
+from contextlib import ExitStack
+from heapq import heappush, heappushpop
+from random import random
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from backend.metrics import REQUESTS, REQUEST_DURATION
+from backend.profiling import RequestProfile, profiling_lock
+
+logger = logging.getLogger('backend.sql')
+
+
+class QueryRecorder:
+    """
+    Обертка выполнения SQL (connection.execute_wrapper), считающая запросы одного HTTP-запроса.
+
+    Формой запроса считается текст SQL с плейсхолдерами без параметров, поэтому
+    одинаковые запросы по разным строкам (N+1) имеют одну форму.
+
+    Attributes:
+    - count (int): количество выполненных запросов.
+    - duration (float): суммарное время выполнения в секундах.
+    - slowest (list): куча из slow_queries самых долгих запросов (время, SQL).
+    - shapes (Counter): количество выполнений каждой формы запроса.
+    """
+
+    def __init__(self, slow_queries):
+        self.slow_queries = slow_queries
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.shapes[sql] += 1
+            if len(self.slowest) < self.slow_queries:
+                heappush(self.slowest, (duration, sql))
+            elif self.slowest and duration > self.slowest[0][0]:
+                heappushpop(self.slowest, (duration, sql))
+
+    def n_plus_one(self, threshold):
+        """
+        Возвращает формы запросов, выполненные не менее threshold раз.
+        """
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Записывает количество и время SQL-запросов для части HTTP-запросов.
+
+    Доля отслеживаемых запросов задается SQL_INSTRUMENTATION_SAMPLE_RATE. Результат
+    отдается в заголовках Server-Timing и X-DB-* и пишется одной JSON-строкой
+    в журнал backend.sql; повторяющиеся формы запросов (не менее
+    SQL_INSTRUMENTATION_N_PLUS_ONE раз) помечаются как подозрение на N+1.
+
+    Запросы, выполненные при отдаче потокового ответа, в статистику не попадают.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(settings.SQL_INSTRUMENTATION_SLOW_QUERIES)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        suspects = recorder.n_plus_one(settings.SQL_INSTRUMENTATION_N_PLUS_ONE)
+        duration = recorder.duration * 1000
+        response['Server-Timing'] = f'db;dur={duration:.1f};desc="{recorder.count} queries"'
+        response['X-DB-Queries'] = str(recorder.count)
+        response['X-DB-Time'] = f'{duration:.1f}'
+        response['X-DB-N-Plus-One'] = str(len(suspects))
+
+        logger.log(logging.WARNING if suspects else logging.INFO, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_time_ms': round(duration, 1),
+            'slowest': [{'sql': sql[:500], 'ms': round(seconds * 1000, 1)}
+                        for seconds, sql in sorted(recorder.slowest, reverse=True)],
+            'n_plus_one': [{'sql': sql[:500], 'count': count} for sql, count in suspects],
+        }, ensure_ascii=False))
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Считает HTTP-запросы и время их обработки для /metrics с меткой view - именем маршрута (basket, order, ...).
+
+    Запросы, не сопоставленные ни одному маршруту, учитываются с view="unmatched",
+    чтобы число меток не зависело от адресов запросов. Для потоковых ответов
+    учитывается время до начала отдачи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = perf_counter()
+        response = self.get_response(request)
+        duration = perf_counter() - start
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.url_name if resolver_match and resolver_match.url_name else 'unmatched'
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        REQUEST_DURATION.labels(view, request.method).observe(duration)
+        return response
+
+
+def is_staff(request):
+    """
+    Проверяет, что запрос выполняет сотрудник: по сессии или по заголовку Authorization,
+    так как аутентификация DRF выполняется только внутри представления.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        authenticators = [authentication_class() for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+    return user.is_staff
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запросы cProfile и tracemalloc и сохраняет результат в кольцевой буфер на диске.
+
+    Профилируется случайная доля запросов PROFILING_SAMPLE_RATE, а при
+    PROFILING_ON_DEMAND - запросы сотрудников с параметром ?profile=1 или
+    заголовком X-Profile: 1. Идентификатор профиля возвращается в заголовке
+    X-Profile-Id. Если оба режима выключены, middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE and not settings.PROFILING_ON_DEMAND:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        if settings.PROFILING_ON_DEMAND and '1' in (request.GET.get('profile'), request.headers.get('X-Profile')):
+            return is_staff(request)
+        return random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        # одновременно профилируется один запрос, остальные выполняются как обычно
+        if not self.should_profile(request) or not profiling_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            with RequestProfile(request) as profile:
+                request.request_profile = profile
+                response = self.get_response(request)
+            response['X-Profile-Id'] = profile.save(response)
+        finally:
+            profiling_lock.release()
+        return response
+
+    def process_template_response(self, request, response):
+        # ответ DRF формируется после возврата из представления
+        profile = getattr(request, 'request_profile', None)
+        if profile is not None:
+            profile.start('render')
+        return response
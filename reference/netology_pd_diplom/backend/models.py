@@ -1,7 +1,14 @@
+from functools import reduce
+from operator import or_
+
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 
@@ -15,6 +22,21 @@ STATE_CHOICES = (
     ('canceled', 'Отменен'),
 )
 
+IMPORT_STATE_CHOICES = (
+    ('queued', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершен'),
+    ('skipped', 'Пропущен, прайс-лист не изменился'),
+    ('failed', 'Ошибка'),
+)
+
+EMAIL_STATE_CHOICES = (
+    ('pending', 'Ожидает отправки'),
+    ('sending', 'Отправляется'),
+    ('sent', 'Отправлено'),
+    ('failed', 'Не отправлено'),
+)
+
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
     ('buyer', 'Покупатель'),
@@ -108,6 +130,9 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
+    etag = models.CharField(verbose_name='ETag прайс-листа', max_length=200, blank=True)
+    last_modified = models.CharField(verbose_name='Last-Modified прайс-листа', max_length=50, blank=True)
+    content_digest = models.CharField(verbose_name='Хеш прайс-листа', max_length=64, blank=True)
 
     # filename
 
@@ -115,10 +140,22 @@ class Shop(models.Model):
         verbose_name = 'Магазин'
         verbose_name_plural = "Список магазинов"
         ordering = ('-name',)
+        indexes = [
+            # список магазинов, принимающих заказы
+            models.Index(fields=['-name'], condition=Q(state=True), name='shop_active'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def get_validators(self, url):
+        """
+        Возвращает ETag и Last-Modified последней загрузки прайс-листа с адреса url.
+        """
+        if url != self.url:
+            return {}
+        return {'etag': self.etag, 'last_modified': self.last_modified}
+
 
 class Category(models.Model):
     objects = models.manager.Manager()
@@ -144,6 +181,9 @@ class Product(models.Model):
         verbose_name = 'Продукт'
         verbose_name_plural = "Список продуктов"
         ordering = ('-name',)
+        indexes = [
+            models.Index(fields=['name', 'category'], name='product_name_category'),
+        ]
 
     def __str__(self):
         return self.name
@@ -160,12 +200,18 @@ class ProductInfo(models.Model):
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    is_active = models.BooleanField(verbose_name='В продаже', default=True)
 
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информационный список о продуктах"
         constraints = [
-            models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_product_info'),
+        ]
+        indexes = [
+            # каталог магазина и категории: только товары в продаже, в порядке курсора
+            models.Index(fields=['shop', 'id'], condition=Q(is_active=True), name='product_info_shop_active'),
+            models.Index(fields=['product'], condition=Q(is_active=True), name='product_info_product_active'),
         ]
 
 
@@ -177,6 +223,9 @@ class Parameter(models.Model):
         verbose_name = 'Имя параметра'
         verbose_name_plural = "Список имен параметров"
         ordering = ('-name',)
+        indexes = [
+            models.Index(fields=['name'], name='parameter_name'),
+        ]
 
     def __str__(self):
         return self.name
@@ -197,6 +246,33 @@ class ProductParameter(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
+        indexes = [
+            models.Index(fields=['parameter', 'value'], name='product_parameter_value'),
+        ]
+
+
+class FacetCount(models.Model):
+    """
+    Предрассчитанное количество предложений магазина в категории с данным значением параметра.
+
+    Пересчитывается при импорте прайс-листа.
+    """
+    objects = models.manager.Manager()
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='facet_counts', blank=True,
+                             on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='facet_counts', blank=True,
+                                 on_delete=models.CASCADE)
+    parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='facet_counts', blank=True,
+                                  on_delete=models.CASCADE)
+    value = models.CharField(verbose_name='Значение', max_length=100)
+    count = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Количество по значению параметра'
+        verbose_name_plural = "Список количеств по значениям параметров"
+        indexes = [
+            models.Index(fields=['category', 'parameter'], name='facet_count_category'),
+        ]
 
 
 class Contact(models.Model):
@@ -221,6 +297,19 @@ class Contact(models.Model):
         return f'{self.city} {self.street} {self.house}'
 
 
+class OutOfStock(Exception):
+    """
+    Недостаточно товара на складе для оформления заказа.
+
+    Attributes:
+    - product_info_id (int): предложение, остатка которого не хватило.
+    """
+
+    def __init__(self, product_info_id):
+        super().__init__(product_info_id)
+        self.product_info_id = product_info_id
+
+
 class Order(models.Model):
     objects = models.manager.Manager()
     user = models.ForeignKey(User, verbose_name='Пользователь',
@@ -231,18 +320,90 @@ class Order(models.Model):
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма заказа', default=0)
+    stock_reserved = models.BooleanField(verbose_name='Товар зарезервирован', default=False, editable=False)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказ"
         ordering = ('-dt',)
+        indexes = [
+            models.Index(fields=['user', 'state'], name='order_user_state'),
+        ]
 
     def __str__(self):
         return str(self.dt)
 
-    # @property
-    # def sum(self):
-    #     return self.ordered_items.aggregate(total=Sum("quantity"))["total"]
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super(Order, self).save(*args, **kwargs)
+        # новые корзины в проекцию не попадают, остальные изменения пересчитывают ее
+        if not adding or self.state != 'basket':
+            ShopOrder.refresh(self.id)
+
+    @staticmethod
+    def reserve_stock(order_id):
+        """
+        Списывает со склада количество товаров заказа.
+
+        Каждая позиция списывается условным UPDATE ... SET quantity = quantity - n
+        WHERE quantity >= n, поэтому параллельные покупатели одного товара не уводят
+        остаток в минус, а строка блокируется только до конца транзакции. Позиции
+        обрабатываются по возрастанию product_info_id, чтобы встречные заказы
+        блокировали строки в одном порядке.
+
+        Вызывается внутри transaction.atomic: при нехватке товара бросает OutOfStock,
+        и откат транзакции возвращает уже списанные позиции. Заказ помечается
+        stock_reserved, повторный вызов для того же заказа ничего не списывает.
+        """
+        if not Order.objects.filter(id=order_id, stock_reserved=False).update(stock_reserved=True):
+            return
+        items = OrderItem.objects.filter(order_id=order_id).order_by('product_info_id').values_list(
+            'product_info_id', 'quantity')
+        for product_info_id, quantity in items:
+            if not ProductInfo.objects.filter(id=product_info_id, is_active=True, quantity__gte=quantity).update(
+                    quantity=F('quantity') - quantity):
+                raise OutOfStock(product_info_id)
+
+    @staticmethod
+    def release_stock(order_id):
+        """
+        Возвращает на склад количество товаров заказа.
+        """
+        items = OrderItem.objects.filter(order_id=order_id).order_by('product_info_id').values_list(
+            'product_info_id', 'quantity')
+        for product_info_id, quantity in items:
+            ProductInfo.objects.filter(id=product_info_id).update(quantity=F('quantity') + quantity)
+
+    @staticmethod
+    def cancel(order_id):
+        """
+        Отменяет оформленный заказ и возвращает на склад зарезервированные товары.
+
+        Статус и отметка stock_reserved меняются условными UPDATE, поэтому товары
+        возвращаются один раз и только если были списаны при оформлении (заказы,
+        созданные в админке, ничего не резервируют).
+
+        Returns:
+        - bool: True, если заказ был отменен этим вызовом.
+        """
+        with transaction.atomic():
+            if not Order.objects.filter(id=order_id).exclude(state__in=('basket', 'canceled')).update(
+                    state='canceled'):
+                return False
+            if Order.objects.filter(id=order_id, stock_reserved=True).update(stock_reserved=False):
+                Order.release_stock(order_id)
+            ShopOrder.refresh(order_id)
+        return True
+
+    @staticmethod
+    def update_total_sum(*order_ids):
+        """
+        Пересчитывает сохраненную сумму заказов по ценам их позиций одним запросом.
+        """
+        total = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id').annotate(
+            total=Sum(F('quantity') * F('price'))).values('total')
+        Order.objects.filter(id__in=order_ids).update(total_sum=Coalesce(Subquery(total), 0))
 
 
 class OrderItem(models.Model):
@@ -254,6 +415,7 @@ class OrderItem(models.Model):
                                      blank=True,
                                      on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена на момент добавления', default=0)
 
     class Meta:
         verbose_name = 'Заказанная позиция'
@@ -262,6 +424,141 @@ class OrderItem(models.Model):
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),
         ]
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.price:
+            self.price = ProductInfo.objects.values_list('price', flat=True).get(id=self.product_info_id)
+        super(OrderItem, self).save(*args, **kwargs)
+        Order.update_total_sum(self.order_id)
+
+    def delete(self, *args, **kwargs):
+        result = super(OrderItem, self).delete(*args, **kwargs)
+        Order.update_total_sum(self.order_id)
+        return result
+
+
+class ShopOrder(models.Model):
+    """
+    Часть заказа, относящаяся к одному магазину.
+
+    Хранит состояние заказа и сумму позиций магазина, чтобы список заказов
+    поставщика выбирался по индексу магазина без соединения со всеми позициями
+    всех заказов. Обновляется методом refresh при оформлении заказа и смене его статуса.
+    """
+    objects = models.manager.Manager()
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='shop_orders', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='shop_orders', on_delete=models.CASCADE)
+    state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
+    dt = models.DateTimeField()
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма позиций магазина', default=0)
+
+    class Meta:
+        verbose_name = 'Заказ магазина'
+        verbose_name_plural = "Список заказов магазинов"
+        ordering = ('-dt',)
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'shop'], name='unique_shop_order'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', '-dt'], name='shop_order_shop_dt'),
+        ]
+
+    def __str__(self):
+        return f'{self.order_id} ({self.shop_id})'
+
+    @staticmethod
+    def refresh(*order_ids):
+        """
+        Пересчитывает части заказов по магазинам по их позициям.
+
+        Корзины в проекцию не попадают, части магазинов, у которых не осталось
+        позиций в заказе, удаляются.
+        """
+        rows = OrderItem.objects.filter(order_id__in=order_ids).exclude(order__state='basket').order_by().values(
+            'order_id', 'product_info__shop_id', 'order__state', 'order__dt').annotate(
+            total=Sum(F('quantity') * F('price')))
+        shop_orders = [ShopOrder(order_id=row['order_id'], shop_id=row['product_info__shop_id'],
+                                 state=row['order__state'], dt=row['order__dt'], total_sum=row['total'])
+                       for row in rows]
+        stale = ShopOrder.objects.filter(order_id__in=order_ids)
+        if shop_orders:
+            ShopOrder.objects.bulk_create(shop_orders, update_conflicts=True, unique_fields=['order', 'shop'],
+                                          update_fields=['state', 'dt', 'total_sum'])
+            stale = stale.exclude(reduce(or_, [Q(order_id=shop_order.order_id, shop_id=shop_order.shop_id)
+                                               for shop_order in shop_orders]))
+        stale.delete()
+
+
+class ImportJob(models.Model):
+    """
+    Фоновая задача импорта прайс-листа.
+
+    Пока идет импорт, количество обработанных товаров хранится в кеше, так как
+    запись в базе выполняется в одной транзакции и не видна до ее завершения.
+    Кеш должен быть общим для воркера и веб-процессов (проверка backend.E001).
+    """
+    objects = models.manager.Manager()
+    user = models.ForeignKey(User, verbose_name='Пользователь',
+                             related_name='import_jobs', blank=True,
+                             on_delete=models.CASCADE)
+    url = models.URLField(verbose_name='Ссылка')
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_STATE_CHOICES, max_length=15, default='queued')
+    processed = models.PositiveIntegerField(verbose_name='Обработано товаров', default=0)
+    stats = models.JSONField(verbose_name='Количество объектов', default=dict, blank=True)
+    errors = models.TextField(verbose_name='Ошибки', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = "Список задач импорта"
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.url} ({self.state})'
+
+    @property
+    def progress_key(self):
+        return f'import-job:{self.pk}:processed'
+
+    def set_progress(self, processed):
+        cache.set(self.progress_key, processed, timeout=24 * 60 * 60)
+
+    def get_progress(self):
+        if self.state == 'running':
+            return cache.get(self.progress_key, self.processed)
+        return self.processed
+
+
+class OutboxEmail(models.Model):
+    """
+    Письмо в очереди на отправку.
+
+    Письма записываются обработчиками сигналов и отправляются задачей send_email
+    пакетами через одно SMTP-соединение.
+    """
+    objects = models.manager.Manager()
+    subject = models.CharField(verbose_name='Тема', max_length=255)
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(verbose_name='Отправитель', max_length=254)
+    to = models.JSONField(verbose_name='Получатели', default=list)
+    state = models.CharField(verbose_name='Статус', choices=EMAIL_STATE_CHOICES, max_length=15, default='pending')
+    attempts = models.PositiveIntegerField(verbose_name='Попыток отправки', default=0)
+    next_attempt_at = models.DateTimeField(verbose_name='Следующая попытка', default=timezone.now)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Письмо'
+        verbose_name_plural = "Очередь писем"
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at'], name='outbox_email_pending'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} ({", ".join(self.to)})'
+
 
 class ConfirmEmailToken(models.Model):
     objects = models.manager.Manager()
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from backend.metrics import EMAILS, EMAIL_SEND_DURATION
+from backend.models import OutboxEmail
+
+
+def queue_email(subject, body, to):
+    """
+    Записывает письмо в очередь и запускает отправку после фиксации транзакции.
+
+    Письмо сохраняется в той же транзакции, что и данные, из-за которых оно
+    отправляется, поэтому при откате транзакции письмо не уйдет.
+
+    Args:
+    - subject (str): тема письма.
+    - body (str): текст письма.
+    - to (list): адреса получателей.
+    """
+    from backend.tasks import send_email
+
+    OutboxEmail.objects.create(subject=subject, body=body, from_email=settings.EMAIL_HOST_USER, to=to)
+    # недоступность брокера не должна превращать уже зафиксированный запрос в ошибку 500,
+    # письмо отправит периодическая задача
+    transaction.on_commit(send_email.delay, robust=True)
+
+
+def retry_delay(attempts):
+    """
+    Экспоненциальная задержка перед следующей попыткой отправки.
+    """
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def deliver_batch(batch_size=None):
+    """
+    Отправляет пакет писем из очереди через одно SMTP-соединение.
+
+    Письма помечаются как sending в короткой транзакции, отправляются вне
+    транзакции, а результат записывается отдельной транзакцией, поэтому строки не
+    заблокированы на время работы SMTP. Письма, оставшиеся в sending дольше
+    EMAIL_OUTBOX_SENDING_TIMEOUT (воркер упал во время отправки), отправляются снова.
+
+    Неотправленные письма откладываются с экспоненциальной задержкой, после
+    EMAIL_OUTBOX_MAX_ATTEMPTS попыток помечаются как failed.
+
+    Args:
+    - batch_size (int): количество писем в пакете, по умолчанию EMAIL_OUTBOX_BATCH_SIZE.
+
+    Returns:
+    - int: количество писем, выбранных для отправки.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        emails = list(OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+            state__in=('pending', 'sending'), next_attempt_at__lte=timezone.now()).order_by('id')[:batch_size])
+        if not emails:
+            return 0
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            state='sending',
+            next_attempt_at=timezone.now() + timedelta(seconds=settings.EMAIL_OUTBOX_SENDING_TIMEOUT))
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            _postpone(email, error)
+    else:
+        try:
+            for email in emails:
+                message = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to,
+                                                 connection=connection)
+                start = perf_counter()
+                try:
+                    message.send()
+                except Exception as error:
+                    _postpone(email, error)
+                else:
+                    email.state = 'sent'
+                    email.attempts += 1
+                    email.sent_at = timezone.now()
+                    EMAILS.labels('sent').inc()
+                EMAIL_SEND_DURATION.observe(perf_counter() - start)
+        finally:
+            connection.close()
+
+    OutboxEmail.objects.bulk_update(emails, ['state', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return len(emails)
+
+
+def _postpone(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.state = 'failed'
+    else:
+        email.state = 'pending'
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    EMAILS.labels(email.state if email.state == 'failed' else 'retry').inc()
+
+
+def deliver_outbox(batch_size=None):
+    """
+    Отправляет все готовые к отправке письма пакетами.
+
+    Returns:
+    - int: количество обработанных писем.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    processed = 0
+    while True:
+        count = deliver_batch(batch_size)
+        processed += count
+        if count < batch_size:
+            return processed
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProductInfoPagination(CursorPagination):
+    """
+    Постраничная выдача товаров по курсору.
+
+    Страницы выбираются условием по первичному ключу (WHERE id > ...), поэтому
+    дальние страницы стоят столько же, сколько первая, а общее количество
+    товаров (COUNT(*)) не считается.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,226 @@
+from contextlib import contextmanager
+from hashlib import sha256
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from requests import get
+from yaml import Loader
+from yaml.events import DocumentStartEvent, MappingEndEvent, MappingStartEvent, SequenceEndEvent, \
+    SequenceStartEvent, StreamStartEvent
+
+
+class PriceListError(ValueError):
+    """
+    Ошибка загрузки или разбора прайс-листа
+    """
+
+
+class ResponseStream:
+    """
+    Файлоподобная обертка над телом HTTP-ответа, читаемым частями.
+
+    Attributes:
+    - max_size (int): максимально допустимый размер тела ответа в байтах.
+    - size (int): количество уже прочитанных байт.
+    - digest: хеш SHA-256 прочитанных данных.
+    """
+
+    def __init__(self, response, max_size, chunk_size):
+        self.chunks = response.iter_content(chunk_size=chunk_size)
+        self.max_size = max_size
+        self.size = 0
+        self.buffer = b''
+        self.digest = sha256()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, b'')
+            if not chunk:
+                break
+            self.size += len(chunk)
+            if self.size > self.max_size:
+                raise PriceListError(f'Размер прайс-листа превышает {self.max_size} байт')
+            self.digest.update(chunk)
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class PriceListDownload:
+    """
+    Результат условного запроса прайс-листа.
+
+    Attributes:
+    - not_modified (bool): сервер ответил 304 Not Modified.
+    - etag (str): значение заголовка ETag ответа.
+    - last_modified (str): значение заголовка Last-Modified ответа.
+    """
+
+    def __init__(self, response, max_size, chunk_size):
+        self.not_modified = response.status_code == 304
+        self.etag = response.headers.get('ETag', '')
+        self.last_modified = response.headers.get('Last-Modified', '')
+        self.stream = ResponseStream(response, max_size, chunk_size)
+        self.chunk_size = chunk_size
+        self.file = None
+
+    @property
+    def digest(self):
+        return self.stream.digest.hexdigest()
+
+    def spool(self):
+        """
+        Скачивает тело ответа во временный файл, одновременно вычисляя хеш.
+
+        Небольшие прайс-листы остаются в памяти, большие сбрасываются на диск
+        после IMPORT_SPOOL_SIZE байт.
+
+        Returns:
+        - SpooledTemporaryFile: файл с прайс-листом, готовый к чтению.
+        """
+        self.file = SpooledTemporaryFile(max_size=settings.IMPORT_SPOOL_SIZE)
+        copyfileobj(self.stream, self.file, self.chunk_size)
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+@contextmanager
+def fetch_price_list(url, etag='', last_modified='', max_size=None, chunk_size=None):
+    """
+    Выполняет условный запрос прайс-листа, не загружая его целиком в память.
+
+    Args:
+    - url (str): адрес прайс-листа.
+    - etag (str): ETag предыдущей загрузки для заголовка If-None-Match.
+    - last_modified (str): Last-Modified предыдущей загрузки для заголовка If-Modified-Since.
+    - max_size (int): ограничение размера тела ответа, по умолчанию IMPORT_MAX_SIZE.
+    - chunk_size (int): размер читаемой части, по умолчанию IMPORT_CHUNK_SIZE.
+
+    Yields:
+    - PriceListDownload: ответ сервера партнера.
+    """
+    max_size = max_size or settings.IMPORT_MAX_SIZE
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    with get(url, headers=headers, stream=True, timeout=settings.IMPORT_TIMEOUT) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > max_size:
+            raise PriceListError(f'Размер прайс-листа превышает {max_size} байт')
+        download = PriceListDownload(response, max_size, chunk_size or settings.IMPORT_CHUNK_SIZE)
+        try:
+            yield download
+        finally:
+            download.close()
+
+
+class PriceListReader:
+    """
+    Потоковый разбор прайс-листа на событиях PyYAML.
+
+    Заголовок прайс-листа (shop, categories) разбирается целиком, а элементы
+    последовательности goods строятся по одному, поэтому в памяти находится
+    только текущий товар. Если goods идут раньше заголовка, при первом проходе
+    они пропускаются, а товары разбираются вторым проходом по файлу.
+    """
+
+    header_keys = ('shop', 'categories')
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.loader = Loader(stream)
+
+    def _construct(self, node):
+        data = self.loader.construct_object(node, deep=True)
+        self.loader.constructed_objects.clear()
+        self.loader.recursive_objects.clear()
+        return data
+
+    def _expect(self, event_class):
+        if not self.loader.check_event(event_class):
+            event = self.loader.peek_event()
+            raise PriceListError(f'Неверный формат прайс-листа: строка {event.start_mark.line + 1}')
+        return self.loader.get_event()
+
+    def _skip(self):
+        """
+        Пропускает очередной узел по событиям, не строя его.
+        """
+        depth = 0
+        while True:
+            event = self.loader.get_event()
+            if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+                depth += 1
+            elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+                depth -= 1
+            if not depth:
+                return
+
+    def _start(self):
+        self._expect(StreamStartEvent)
+        self._expect(DocumentStartEvent)
+        self._expect(MappingStartEvent)
+
+    def read(self):
+        """
+        Разбирает ключи прайс-листа до последовательности goods.
+
+        Прайс-лист без ключа goods отклоняется, чтобы опечатка в ключе не сняла
+        с продажи все товары магазина; пустой каталог задается явно: goods: [].
+
+        Returns:
+        - dict: ключи прайс-листа, где goods - генератор товаров.
+        """
+        loader = self.loader
+        self._start()
+
+        data = {}
+        while not loader.check_event(MappingEndEvent):
+            key = self._construct(loader.compose_node(None, None))
+            if key == 'goods':
+                if all(header_key in data for header_key in self.header_keys):
+                    data['goods'] = self.iter_goods()
+                    break
+                if not hasattr(self.stream, 'seek'):
+                    raise PriceListError('Неверный формат прайс-листа: goods должны идти после shop и categories')
+                self._skip()
+                data['goods'] = self.iter_goods(rewind=True)
+            else:
+                data[key] = self._construct(loader.compose_node(None, None))
+        if 'goods' not in data:
+            raise PriceListError('Неверный формат прайс-листа: отсутствует ключ goods')
+        return data
+
+    def iter_goods(self, rewind=False):
+        """
+        Последовательно строит элементы goods.
+
+        Args:
+        - rewind (bool): перечитать файл с начала до ключа goods (goods идут раньше заголовка).
+
+        Yields:
+        - dict: товар в формате прайс-листа.
+        """
+        if rewind:
+            self.loader.dispose()
+            self.stream.seek(0)
+            self.loader = Loader(self.stream)
+            self._start()
+            while self._construct(self.loader.compose_node(None, None)) != 'goods':
+                self._skip()
+        loader = self.loader
+        self._expect(SequenceStartEvent)
+        while not loader.check_event(SequenceEndEvent):
+            yield self._construct(loader.compose_node(None, None))
+        loader.get_event()
+        loader.dispose()
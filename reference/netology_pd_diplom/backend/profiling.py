@@ -0,0 +1,165 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import tracemalloc
+from threading import Lock
+from time import perf_counter, time, time_ns
+
+from django.conf import settings
+
+PROFILE_ID_RE = re.compile(r'^\d+-\d+$')
+
+PHASES = ('view', 'render')
+
+# tracemalloc общий для процесса, поэтому одновременно профилируется один запрос
+profiling_lock = Lock()
+
+
+class RequestProfile:
+    """
+    Профиль одного HTTP-запроса по фазам: view (обработчик и сериализация) и render (формирование JSON).
+
+    Для каждой фазы собирается отдельный cProfile, время и пик памяти по
+    tracemalloc, после окончания запроса - самые крупные выделения памяти.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.profiles = {}
+        self.durations = {}
+        self.memory_peaks = {}
+        self.phase = None
+        self.started_at = None
+
+    def start(self, phase):
+        self.stop()
+        self.phase = phase
+        self.profiles[phase] = cProfile.Profile()
+        tracemalloc.reset_peak()
+        self.started_at = perf_counter()
+        self.profiles[phase].enable()
+
+    def stop(self):
+        if self.phase is None:
+            return
+        self.profiles[self.phase].disable()
+        self.durations[self.phase] = perf_counter() - self.started_at
+        self.memory_peaks[self.phase] = tracemalloc.get_traced_memory()[1]
+        self.phase = None
+
+    def __enter__(self):
+        # не останавливаем tracemalloc, если его запустили до нас (PYTHONTRACEMALLOC)
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.start('view')
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        self.allocations = tracemalloc.take_snapshot().statistics('lineno')[:settings.PROFILING_TOP_ALLOCATIONS]
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def save(self, response):
+        """
+        Записывает профиль в кольцевой буфер PROFILING_DIR и удаляет самые старые записи
+        сверх PROFILING_MAX_PROFILES.
+
+        Returns:
+        - str: идентификатор профиля.
+        """
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        profile_id = f'{time_ns()}-{os.getpid()}'
+        phases = {}
+        for phase, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(settings.PROFILING_DIR, f'{profile_id}.{phase}.prof'))
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(
+                settings.PROFILING_TOP_FUNCTIONS)
+            phases[phase] = {
+                'duration_ms': round(self.durations[phase] * 1000, 1),
+                'memory_peak_kb': round(self.memory_peaks[phase] / 1024, 1),
+                'stats': output.getvalue(),
+            }
+        user = getattr(self.request, 'user', None)
+        metadata = {
+            'id': profile_id,
+            'created_at': time(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'status': response.status_code,
+            'user': user.email if user is not None and user.is_authenticated else None,
+            'phases': phases,
+            'allocations': [{'location': str(statistic.traceback), 'size_kb': round(statistic.size / 1024, 1),
+                             'count': statistic.count} for statistic in self.allocations],
+        }
+        with open(os.path.join(settings.PROFILING_DIR, f'{profile_id}.json'), 'w', encoding='utf-8') as file:
+            json.dump(metadata, file, ensure_ascii=False)
+        trim_profiles()
+        return profile_id
+
+
+def _profile_ids():
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    ids = [name[:-len('.json')] for name in os.listdir(settings.PROFILING_DIR) if name.endswith('.json')]
+    return sorted(ids, key=lambda profile_id: int(profile_id.split('-')[0]), reverse=True)
+
+
+def trim_profiles():
+    """
+    Удаляет самые старые профили сверх PROFILING_MAX_PROFILES.
+    """
+    for profile_id in _profile_ids()[settings.PROFILING_MAX_PROFILES:]:
+        for name in [f'{profile_id}.json', *[f'{profile_id}.{phase}.prof' for phase in PHASES]]:
+            try:
+                os.remove(os.path.join(settings.PROFILING_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """
+    Возвращает краткие данные сохраненных профилей, новые первыми.
+    """
+    profiles = []
+    for profile_id in _profile_ids():
+        metadata = get_profile(profile_id)
+        if metadata:
+            profiles.append({
+                'id': metadata['id'],
+                'created_at': metadata['created_at'],
+                'method': metadata['method'],
+                'path': metadata['path'],
+                'status': metadata['status'],
+                'user': metadata['user'],
+                'duration_ms': {phase: data['duration_ms'] for phase, data in metadata['phases'].items()},
+            })
+    return profiles
+
+
+def get_profile(profile_id):
+    """
+    Возвращает данные профиля или None, если профиль не найден.
+    """
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILING_DIR, f'{profile_id}.json'), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def get_profile_stats_path(profile_id, phase):
+    """
+    Возвращает путь к файлу pstats фазы профиля или None, если файла нет.
+    """
+    if not PROFILE_ID_RE.match(profile_id) or phase not in PHASES:
+        return None
+    path = os.path.join(settings.PROFILING_DIR, f'{profile_id}.{phase}.prof')
+    return path if os.path.exists(path) else None
@@ -0,0 +1,105 @@
+import codecs
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson:
+    # datetime, date и time передаются в default, чтобы формат совпадал с json-кодировщиками Django и DRF
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def orjson_dumps(data, encoder_class):
+    """
+    Кодирует данные в компактный JSON в UTF-8 через orjson.
+
+    Значения, которые orjson не поддерживает, передаются в default кодировщика
+    encoder_class.
+
+    Returns:
+    - bytes: JSON или None, если orjson не установлен или не смог закодировать данные.
+    """
+    if orjson is None:
+        return None
+    try:
+        content = orjson.dumps(data, default=encoder_class().default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return None
+    # как и JSONRenderer, экранируем U+2028 и U+2029, чтобы ответ оставался корректным JavaScript
+    return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson.
+
+    Выводит те же байты, что и JSONRenderer. Если orjson не установлен, запрошен
+    отступ, изменены настройки UNICODE_JSON/COMPACT_JSON или данные не
+    поддерживаются orjson, используется стандартный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        content = None
+        if not self.ensure_ascii and self.compact and \
+                self.get_indent(accepted_media_type, renderer_context or {}) is None:
+            content = orjson_dumps(data, self.encoder_class)
+        if content is None:
+            content = super().render(data, accepted_media_type, renderer_context)
+        return content
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser на orjson. Тело в кодировке, отличной от UTF-8, разбирается стандартным JSONParser.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    """
+    Ответ с JSON-массивом, который формируется по мере чтения queryset.
+
+    Queryset читается через iterator(chunk_size) с prefetch_related на каждую
+    порцию, поэтому в памяти находится только одна порция объектов, а первые
+    байты уходят клиенту до окончания выборки.
+
+    Args:
+    - queryset (QuerySet): упорядоченная выборка объектов.
+    - serializer_class: сериализатор с методом to_representation (FastSerializer).
+    - chunk_size (int): количество объектов в порции, по умолчанию STREAM_CHUNK_SIZE.
+    """
+
+    def __init__(self, queryset, serializer_class, chunk_size=None, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+        super().__init__(self.iter_json(queryset, serializer_class(None), chunk_size), **kwargs)
+
+    @staticmethod
+    def iter_json(queryset, serializer, chunk_size):
+        renderer = ORJSONRenderer()
+        objects = queryset.iterator(chunk_size=chunk_size)
+        separator = b'['
+        while chunk := list(islice(objects, chunk_size)):
+            yield separator + b','.join(renderer.render(serializer.to_representation(obj)) for obj in chunk)
+            separator = b','
+        yield b']' if separator == b',' else b'[]'
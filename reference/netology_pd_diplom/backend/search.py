@@ -0,0 +1,163 @@
+import re
+
+from django.db import connections, router
+
+from backend.models import ProductInfo, ProductParameter
+
+SEARCH_TABLE = 'backend_productsearch'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _documents(ids):
+    """
+    Собирает текст для индекса: название продукта, модель и значения параметров.
+    """
+    parameters = {}
+    for product_info_id, value in ProductParameter.objects.filter(
+            product_info_id__in=ids).order_by().values_list('product_info_id', 'value'):
+        parameters.setdefault(product_info_id, []).append(value)
+    return [(pk, name, model, ' '.join(parameters.get(pk, [])))
+            for pk, name, model in ProductInfo.objects.filter(id__in=ids, is_active=True).order_by().values_list(
+                'id', 'product__name', 'model')]
+
+
+class SQLiteSearchIndex:
+    """
+    Полнотекстовый индекс на виртуальной таблице SQLite FTS5
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                           f"name, model, parameters, tokenize='unicode61 remove_diacritics 2')")
+
+    def remove(self, ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def update(self, ids):
+        self.remove(ids)
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, name, model, parameters) VALUES (%s, %s, %s, %s)',
+                               _documents(ids))
+
+    def search(self, words, limit, subquery, params):
+        # каждое слово ищется как префикс, слова объединяются через AND
+        query = ' '.join(f'"{word}"*' for word in words)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({subquery}) '
+                           f'ORDER BY bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) LIMIT %s', [query, *params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchIndex:
+    """
+    Полнотекстовый индекс на tsvector с GIN-индексом PostgreSQL
+    """
+    config = 'russian'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+                           f'product_info_id bigint PRIMARY KEY REFERENCES backend_productinfo (id) ON DELETE CASCADE, '
+                           f'document tsvector NOT NULL)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)')
+
+    def remove(self, ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE product_info_id = ANY(%s)', [list(ids)])
+
+    def update(self, ids):
+        self.remove(ids)
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (product_info_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.config}', %s), 'B') || "
+                f"setweight(to_tsvector('{self.config}', %s), 'C'))",
+                _documents(ids))
+
+    def search(self, words, limit, subquery, params):
+        query = ' & '.join(f'{word}:*' for word in words)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT product_info_id FROM {SEARCH_TABLE}, to_tsquery('{self.config}', %s) query "
+                           f"WHERE document @@ query AND product_info_id IN ({subquery}) "
+                           f"ORDER BY ts_rank(document, query) DESC LIMIT %s", [query, *params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_INDEXES = {
+    'sqlite': SQLiteSearchIndex,
+    'postgresql': PostgreSQLSearchIndex,
+}
+
+
+def get_search_index(using=None):
+    """
+    Возвращает полнотекстовый индекс для базы данных или None, если СУБД не поддерживается.
+    """
+    connection = connections[using or router.db_for_write(ProductInfo)]
+    index_class = SEARCH_INDEXES.get(connection.vendor)
+    return index_class(connection) if index_class else None
+
+
+def create_search_index(using=None, **kwargs):
+    """
+    Создает таблицу полнотекстового индекса (обработчик post_migrate).
+    """
+    index = get_search_index(using)
+    if index:
+        index.create()
+
+
+def update_search_index(ids):
+    """
+    Перестраивает записи индекса для указанных предложений.
+    """
+    index = get_search_index()
+    if index and ids:
+        index.update(list(ids))
+
+
+def remove_from_search_index(ids):
+    """
+    Удаляет предложения из индекса.
+    """
+    index = get_search_index()
+    if index and ids:
+        index.remove(list(ids))
+
+
+def search_product_infos(text, limit, queryset=None):
+    """
+    Ищет предложения по тексту.
+
+    Фильтры queryset выполняются в том же запросе к индексу, поэтому limit
+    ограничивает уже отфильтрованные результаты.
+
+    Args:
+    - text (str): поисковый запрос.
+    - limit (int): максимальное количество самых релевантных результатов.
+    - queryset (QuerySet): предложения, среди которых выполняется поиск, по умолчанию все.
+
+    Returns:
+    - list: идентификаторы предложений по убыванию релевантности или None,
+      если СУБД не поддерживает полнотекстовый индекс.
+    """
+    words = WORD_RE.findall(text.lower())
+    index = get_search_index()
+    if index is None:
+        return None
+    if not words:
+        return []
+    if queryset is None:
+        queryset = ProductInfo.objects.all()
+    subquery, params = queryset.order_by().values('id').query.sql_with_params()
+    return index.search(words, limit, subquery, params)
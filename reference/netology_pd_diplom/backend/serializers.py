@@ -1,7 +1,10 @@
 # Верстальщик
+from abc import ABC, abstractmethod
+
 from rest_framework import serializers
 
-from backend.models import User, Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact
+from backend.models import User, Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact, \
+    ImportJob
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -80,10 +83,118 @@ class OrderItemCreateSerializer(OrderItemSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
 
-    total_sum = serializers.IntegerField()
     contact = ContactSerializer(read_only=True)
 
     class Meta:
         model = Order
         fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'total_sum',)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    processed = serializers.IntegerField(source='get_progress')
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'url', 'state', 'processed', 'stats', 'errors', 'created_at', 'finished_at',)
+        read_only_fields = fields
+
+
+class FastSerializer(ABC):
+    """
+    Сериализатор только для чтения, собирающий словари напрямую из загруженных строк.
+
+    Повторяет вывод соответствующего ModelSerializer без обхода полей DRF
+    на каждом объекте. Связанные объекты должны быть загружены заранее
+    (select_related/prefetch_related), иначе каждый из них вызовет отдельный запрос.
+    """
+
+    def __init__(self, instance, many=False):
+        self.instance = instance
+        self.many = many
+
+    @abstractmethod
+    def to_representation(self, instance):
+        """
+        Собирает словарь одного объекта
+        """
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(instance) for instance in self.instance]
+        return self.to_representation(self.instance)
+
+
+class ProductInfoFastSerializer(FastSerializer):
+    """
+    Быстрый аналог ProductInfoSerializer
+    """
+
+    def to_representation(self, instance):
+        product = instance.product
+        return {
+            'id': instance.id,
+            'model': instance.model,
+            'product': {
+                'name': product.name,
+                'category': str(product.category),
+            },
+            'shop': instance.shop_id,
+            'quantity': instance.quantity,
+            'price': instance.price,
+            'price_rrc': instance.price_rrc,
+            'product_parameters': [{'parameter': str(product_parameter.parameter), 'value': product_parameter.value}
+                                   for product_parameter in instance.product_parameters.all()],
+        }
+
+
+class OrderFastSerializer(FastSerializer):
+    """
+    Быстрый аналог OrderSerializer
+    """
+    contact_fields = ('id', 'city', 'street', 'house', 'structure', 'building', 'apartment', 'phone')
+    dt_field = serializers.DateTimeField()
+
+    def __init__(self, instance, many=False):
+        super().__init__(instance, many)
+        self.product_info_serializer = ProductInfoFastSerializer(None)
+
+    def items_data(self, items):
+        return [{'id': item.id,
+                 'product_info': self.product_info_serializer.to_representation(item.product_info),
+                 'quantity': item.quantity}
+                for item in items]
+
+    def contact_data(self, contact):
+        return {field: getattr(contact, field) for field in self.contact_fields} if contact else None
+
+    def to_representation(self, instance):
+        return {
+            'id': instance.id,
+            'ordered_items': self.items_data(instance.ordered_items.all()),
+            'state': instance.state,
+            'dt': self.dt_field.to_representation(instance.dt),
+            'total_sum': instance.total_sum,
+            'contact': self.contact_data(instance.contact),
+        }
+
+
+class ShopOrderFastSerializer(OrderFastSerializer):
+    """
+    Заказ в формате OrderSerializer, ограниченный позициями и суммой одного магазина.
+
+    Позиции магазина должны быть загружены в атрибут order.shop_items
+    (Prefetch с to_attr='shop_items').
+    """
+
+    def to_representation(self, instance):
+        order = instance.order
+        return {
+            'id': instance.order_id,
+            'ordered_items': self.items_data(order.shop_items),
+            'state': instance.state,
+            'dt': self.dt_field.to_representation(instance.dt),
+            'total_sum': instance.total_sum,
+            'contact': self.contact_data(order.contact),
+        }
@@ -1,12 +1,13 @@
 from typing import Type
 
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver, Signal
 from django_rest_passwordreset.signals import reset_password_token_created
+from rest_framework.authtoken.models import Token
 
+from backend.authentication import token_cache
 from backend.models import ConfirmEmailToken, User
+from backend.outbox import queue_email
 
 new_user_registered = Signal()
 
@@ -26,17 +27,14 @@ def password_reset_token_created(sender, instance, reset_password_token, **kwarg
     """
     # send an e-mail to the user
 
-    msg = EmailMultiAlternatives(
+    queue_email(
         # title:
         f"Password Reset Token for {reset_password_token.user}",
         # message:
         reset_password_token.key,
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [reset_password_token.user.email]
     )
-    msg.send()
 
 
 @receiver(post_save, sender=User)
@@ -48,17 +46,14 @@ def new_user_registered_signal(sender: Type[User], instance: User, created: bool
         # send an e-mail to the user
         token, _ = ConfirmEmailToken.objects.get_or_create(user_id=instance.pk)
 
-        msg = EmailMultiAlternatives(
+        queue_email(
             # title:
             f"Password Reset Token for {instance.email}",
             # message:
             token.key,
-            # from:
-            settings.EMAIL_HOST_USER,
             # to:
             [instance.email]
         )
-        msg.send()
 
 
 @receiver(new_order)
@@ -69,14 +64,27 @@ def new_order_signal(user_id, **kwargs):
     # send an e-mail to the user
     user = User.objects.get(id=user_id)
 
-    msg = EmailMultiAlternatives(
+    queue_email(
         # title:
         f"Обновление статуса заказа",
         # message:
         'Заказ сформирован',
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [user.email]
     )
-    msg.send()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted_signal(sender, instance, **kwargs):
+    """
+    удаляем токен из кеша аутентификации
+    """
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed_signal(sender, instance, **kwargs):
+    """
+    удаляем токены пользователя из кеша аутентификации
+    """
+    token_cache.delete_user(instance.pk)
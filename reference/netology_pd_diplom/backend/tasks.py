@@ -0,0 +1,86 @@
+from time import perf_counter
+
+from celery import shared_task
+from django.utils import timezone
+from requests import RequestException
+from yaml import YAMLError
+
+from backend.importer import PriceListImporter
+from backend.metrics import IMPORTS, IMPORT_DURATION, IMPORT_ROWS
+from backend.models import Shop, ImportJob
+from backend.outbox import deliver_outbox
+from backend.pricelist import PriceListError, PriceListReader, fetch_price_list
+
+
+@shared_task
+def do_import(job_id):
+    """
+    Загружает прайс-лист задачи импорта и записывает товары магазина.
+
+    Импорт пропускается, если сервер ответил 304 Not Modified на условный запрос
+    или хеш прайс-листа совпал с хешем последней загрузки.
+
+    Args:
+    - job_id (int): идентификатор ImportJob.
+
+    Returns:
+    - dict: количество записанных строк по таблицам.
+    """
+    job = ImportJob.objects.get(id=job_id)
+    job.state = 'running'
+    job.save(update_fields=['state'])
+
+    start = perf_counter()
+    importer = None
+    shop = Shop.objects.filter(user_id=job.user_id).first()
+    try:
+        with fetch_price_list(job.url, **(shop.get_validators(job.url) if shop else {})) as download:
+            if download.not_modified:
+                job.state = 'skipped'
+            else:
+                stream = download.spool()
+                if shop and shop.url == job.url and shop.content_digest == download.digest:
+                    job.state = 'skipped'
+                else:
+                    data = PriceListReader(stream).read()
+
+                    shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=job.user_id)
+                    importer = PriceListImporter(shop, progress=job.set_progress)
+                    job.stats = importer.run(data)
+                    job.state = 'done'
+                    shop.content_digest = download.digest
+            if shop and not download.not_modified:
+                shop.url = job.url
+                shop.etag = download.etag
+                shop.last_modified = download.last_modified
+                shop.save(update_fields=['url', 'etag', 'last_modified', 'content_digest'])
+    except (RequestException, PriceListError, YAMLError) as error:
+        job.state = 'failed'
+        job.errors = str(error)
+    except KeyError as error:
+        job.state = 'failed'
+        job.errors = f'В прайс-листе отсутствует ключ {error}'
+    except Exception as error:
+        job.state = 'failed'
+        job.errors = str(error)
+        raise
+    finally:
+        job.processed = importer.processed if importer else 0
+        job.finished_at = timezone.now()
+        job.save(update_fields=['state', 'stats', 'errors', 'processed', 'finished_at'])
+        IMPORTS.labels(job.state).inc()
+        IMPORT_DURATION.labels(job.state).observe(perf_counter() - start)
+        for kind, rows in job.stats.items():
+            IMPORT_ROWS.labels(kind).inc(rows)
+    return job.stats
+
+
+@shared_task
+def send_email():
+    """
+    Отправляет письма из очереди пакетами через одно SMTP-соединение.
+
+    Returns:
+    - int: количество обработанных писем.
+    """
+    return deliver_outbox()
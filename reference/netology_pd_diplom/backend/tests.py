@@ -1,3 +1,1114 @@
-from django.test import TestCase
+import json
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from pstats import Stats
+from tempfile import TemporaryDirectory
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Barrier, Thread
+from time import sleep
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import parse_http_date
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from yaml import dump as dump_yaml, load as load_yaml, Loader
+
+from backend.admin import OrderAdminForm
+from backend.authentication import token_cache
+from backend.benchmark import LoadStats, generate_price_list, percentile
+from backend.cache import invalidate
+from backend.checks import check_shared_cache
+from backend.importer import PriceListImporter
+from backend.middleware import QueryRecorder
+from backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, ImportJob, \
+    Order, OrderItem, OutboxEmail, Contact, ShopOrder, FacetCount
+from backend.outbox import deliver_outbox
+from backend.pricelist import PriceListError, PriceListReader
+from backend.renderers import ORJSONParser, ORJSONRenderer
+from backend.serializers import ProductInfoSerializer, ProductInfoFastSerializer, OrderSerializer, \
+    OrderFastSerializer
+from netology_pd_diplom.celery import app as celery_app
+
+PRICE_LIST = """
+shop: Связной
+categories:
+  - id: 224
+    name: Смартфоны
+  - id: 15
+    name: Аксессуары
+
+goods:
+  - id: 4216292
+    category: 224
+    model: apple/iphone/xs-max
+    name: Смартфон Apple iPhone XS Max 512GB (золотистый)
+    price: 110000
+    price_rrc: 116990
+    quantity: 14
+    parameters:
+      "Диагональ (дюйм)": 6.5
+      "Встроенная память (Гб)": 512
+      "Цвет": золотистый
+  - id: 4216313
+    category: 224
+    model: apple/iphone/xr
+    name: Смартфон Apple iPhone XR 256GB (красный)
+    price: 65000
+    price_rrc: 69990
+    quantity: 9
+    parameters:
+      "Диагональ (дюйм)": 6.1
+      "Встроенная память (Гб)": 256
+      "Цвет": красный
+  - id: 4672670
+    category: 15
+    model: apple/airpods
+    name: Наушники Apple AirPods
+    price: 12000
+    price_rrc: 13990
+    quantity: 30
+    parameters:
+      "Цвет": белый
+"""
+
+# тесты работают со своим кешем в памяти процесса, не затрагивая кеш на диске из настроек;
+# задачи celery в тестах выполняются сразу, поэтому общий кеш им не нужен
+test_caches = override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'backend-tests',
+    }
+})
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    cache.clear()
+    test_caches.disable()
+
+
+class PriceListHandler(BaseHTTPRequestHandler):
+    """
+    Отдает прайс-лист сервера PriceListServer
+    """
+
+    def do_GET(self):
+        body = self.server.body.encode()
+        self.server.requests.append(dict(self.headers))
+        if self.server.etag and self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-yaml')
+        if self.server.etag:
+            self.send_header('ETag', self.server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PriceListServer(ThreadingHTTPServer):
+    """
+    Локальный HTTP-сервер партнера для тестов импорта
+    """
+
+    def __init__(self, body, etag=None):
+        super().__init__(('127.0.0.1', 0), PriceListHandler)
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/shop.yaml'
+
+    def __enter__(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class PriceListImporterTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='password', type='shop')
+        self.shop = Shop.objects.create(name='Связной', user=self.user)
+        self.data = load_yaml(PRICE_LIST, Loader=Loader)
+
+    def test_import_writes_all_rows(self):
+        stats = PriceListImporter(self.shop, batch_size=2).run(self.data)
+
+        self.assertEqual(stats, {'categories': 2, 'products': 3, 'parameters': 3,
+                                 'inserted': 3, 'updated': 0, 'unchanged': 0, 'removed': 0})
+        self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), 3)
+        self.assertEqual(ProductParameter.objects.count(), 7)
+        self.assertEqual(set(self.shop.categories.values_list('id', flat=True)), {224, 15})
+        self.assertEqual(ProductParameter.objects.get(product_info__external_id=4216292,
+                                                      parameter__name='Диагональ (дюйм)').value, '6.5')
+
+    def test_generated_price_list(self):
+        data = load_yaml(dump_yaml(generate_price_list(1, goods=20, parameters=3, categories=2),
+                                   allow_unicode=True), Loader=Loader)
+        stats = PriceListImporter(self.shop).run(data)
+
+        self.assertEqual(stats['inserted'], 20)
+        self.assertEqual(stats['categories'], 2)
+        self.assertEqual(ProductParameter.objects.count(), 20 * 3)
+        # товары с одинаковыми номерами у разных магазинов относятся к одним продуктам
+        other = Shop.objects.create(name='Другой', user=User.objects.create_user(email='other@example.com'))
+        self.assertEqual(PriceListImporter(other).run(generate_price_list(2, goods=20, parameters=3,
+                                                                          categories=2))['products'], 0)
+
+    def test_reimport_reuses_lookups(self):
+        PriceListImporter(self.shop).run(self.data)
+        self.data['categories'][0]['name'] = 'Телефоны'
+
+        with self.assertNumQueries(10):
+            stats = PriceListImporter(self.shop).run(self.data)
+
+        self.assertEqual(stats, {'categories': 2, 'products': 0, 'parameters': 0,
+                                 'inserted': 0, 'updated': 0, 'unchanged': 3, 'removed': 0})
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Parameter.objects.count(), 3)
+        self.assertEqual(Category.objects.get(id=224).name, 'Телефоны')
+
+    def test_delta_sync(self):
+        PriceListImporter(self.shop).run(self.data)
+        airpods = ProductInfo.objects.get(external_id=4672670)
+        iphone = ProductInfo.objects.get(external_id=4216292)
+        order = Order.objects.create(user=self.user, state='new')
+        OrderItem.objects.create(order=order, product_info=airpods, quantity=1)
+
+        goods = self.data['goods']
+        goods[0]['price'] = 99000
+        goods[1]['parameters']['Цвет'] = 'черный'
+        del goods[1]['parameters']['Диагональ (дюйм)']
+        goods[2] = dict(goods[2], id=4672671, parameters={'Цвет': 'черный'})
+        stats = PriceListImporter(self.shop).run(self.data)
+
+        self.assertEqual(stats, {'categories': 2, 'products': 0, 'parameters': 0,
+                                 'inserted': 1, 'updated': 2, 'unchanged': 0, 'removed': 1})
+        iphone.refresh_from_db()
+        self.assertEqual(iphone.price, 99000)
+        self.assertEqual(dict(ProductParameter.objects.filter(product_info__external_id=4216313).values_list(
+            'parameter__name', 'value')), {'Встроенная память (Гб)': '256', 'Цвет': 'черный'})
+        airpods.refresh_from_db()
+        self.assertFalse(airpods.is_active)
+        self.assertEqual(airpods.quantity, 0)
+        self.assertTrue(OrderItem.objects.filter(product_info=airpods).exists())
+
+
+class BenchmarkTest(TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 99), 4)
+        self.assertEqual(percentile([1, 2, 3, 4], 0), 1)
+        self.assertEqual(percentile([], 95), 0)
+
+    def test_report(self):
+        stats = LoadStats()
+        for latency, queries in ((0.4, 2), (0.1, 4), (0.2, 3), (0.3, 3)):
+            stats.record('products', latency, queries, ok=latency < 0.4)
+        stats.elapsed = 2
+
+        [row] = stats.report()
+        self.assertEqual(row, {'endpoint': 'products', 'requests': 4, 'errors': 1, 'rps': 2,
+                               'p50': 200, 'p95': 400, 'p99': 400, 'queries': 3})
+
+
+class ProductInfoViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='shop@example.com', password='password', type='shop')
+        self.shop = Shop.objects.create(name='Связной', user=self.user)
+        PriceListImporter(self.shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+        self.client = APIClient()
+
+    def test_cursor_pagination(self):
+        first = self.client.get(reverse('backend:products'), {'page_size': 2}).json()
+        self.assertEqual([item['id'] for item in first['results']],
+                         list(ProductInfo.objects.order_by('id').values_list('id', flat=True)[:2]))
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first['next']).json()
+
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'] or 'OFFSET' in query['sql']])
+
+    @override_settings(STREAM_CHUNK_SIZE=2)
+    def test_streaming(self):
+        expected = self.client.get(reverse('backend:products'), {'page_size': 100}).json()['results']
+
+        response = self.client.get(reverse('backend:products'), {'stream': 1})
+        chunks = list(response.streaming_content)
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(json.loads(b''.join(chunks)), expected)
+
+        response = self.client.get(reverse('backend:products'), {'stream': 1, 'search': 'nothing'})
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def test_filters(self):
+        response = self.client.get(reverse('backend:products'), {'category_id': 15})
+
+        self.assertEqual([item['model'] for item in response.json()['results']], ['apple/airpods'])
+
+    def test_search(self):
+        results = self.client.get(reverse('backend:products'), {'search': 'iphone 256'}).json()['results']
+        self.assertEqual([item['model'] for item in results], ['apple/iphone/xr'])
+
+        results = self.client.get(reverse('backend:products'), {'search': 'смартф'}).json()['results']
+        self.assertEqual({item['model'] for item in results}, {'apple/iphone/xs-max', 'apple/iphone/xr'})
+
+        first = self.client.get(reverse('backend:products'), {'search': 'apple', 'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len({item['id'] for item in first['results'] + second['results']}), 3)
+
+    @override_settings(SEARCH_MAX_RESULTS=1)
+    def test_search_limit_after_filters(self):
+        [best] = self.client.get(reverse('backend:products'), {'search': 'apple'}).json()['results']
+        category_id = 15 if best['model'] != 'apple/airpods' else 224
+
+        results = self.client.get(reverse('backend:products'), {'search': 'apple', 'category_id': category_id}).json()
+        self.assertEqual(len(results['results']), 1)
+        self.assertNotEqual(results['results'][0]['id'], best['id'])
+
+    def test_search_index_follows_import(self):
+        data = load_yaml(PRICE_LIST, Loader=Loader)
+        data['goods'][2]['parameters']['Цвет'] = 'розовый'
+        del data['goods'][1]
+        PriceListImporter(self.shop).run(data)
+
+        self.assertEqual(self.client.get(reverse('backend:products'), {'search': 'белый'}).json()['results'], [])
+        self.assertEqual(len(self.client.get(reverse('backend:products'), {'search': 'розовый'}).json()['results']), 1)
+        self.assertEqual(self.client.get(reverse('backend:products'), {'search': 'XR'}).json()['results'], [])
+
+    def test_parameter_filters_and_facets(self):
+        data = self.client.get(reverse('backend:products'), {'category_id': 224}).json()
+        self.assertEqual(data['facets']['Цвет'], {'золотистый': 1, 'красный': 1})
+
+        data = self.client.get(reverse('backend:products'), {
+            'parameter': ['Встроенная память (Гб):256', 'Цвет:красный']}).json()
+        self.assertEqual([item['model'] for item in data['results']], ['apple/iphone/xr'])
+        self.assertEqual(data['facets']['Диагональ (дюйм)'], {'6.1': 1})
+
+        data = self.client.get(reverse('backend:products'), {'parameter': 'Цвет:черный'}).json()
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['facets'], {})
+
+    def test_response_cache(self):
+        url = reverse('backend:products')
+        self.client.get(url, {'shop_id': self.shop.id})
+        with self.assertNumQueries(0):
+            self.client.get(url, {'shop_id': self.shop.id})
+            self.client.get(url, {'shop_id': self.shop.id})
+
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('backend:partner-state'), {'state': 'off'})
+
+        self.assertEqual(self.client.get(url, {'shop_id': self.shop.id}).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('backend:shops')).json()['results'], [])
+
+    def test_conditional_get(self):
+        url = reverse('backend:products')
+        response = self.client.get(url, {'shop_id': self.shop.id})
+        etag = response['ETag']
+        shops = self.client.get(reverse('backend:shops'))
+        self.assertTrue(response['Last-Modified'])
+        self.assertNotEqual(self.client.get(url, {'shop_id': self.shop.id, 'stream': 1})['ETag'], etag)
+
+        with mock.patch('backend.views.get_cached_response') as get_cached_response, self.assertNumQueries(0):
+            response = self.client.get(url, {'shop_id': self.shop.id}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(reverse('backend:shops'), HTTP_IF_NONE_MATCH=shops['ETag'])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(reverse('backend:shops'), HTTP_IF_MODIFIED_SINCE=shops['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+        get_cached_response.assert_not_called()
+
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('backend:partner-state'), {'state': 'off'})
+
+        response = self.client.get(url, {'shop_id': self.shop.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(reverse('backend:shops'), HTTP_IF_NONE_MATCH=shops['ETag'])
+        self.assertEqual(response.json()['results'], [])
+
+    def test_last_modified_within_second(self):
+        cache.clear()
+        url = reverse('backend:shops')
+        with mock.patch('backend.cache.time_ns', return_value=10_200_000_000):
+            last_modified = self.client.get(url)['Last-Modified']
+
+        with mock.patch('backend.cache.time_ns', return_value=10_700_000_000):
+            invalidate('shops')
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(parse_http_date(response['Last-Modified']), parse_http_date(last_modified))
+
+            invalidate('shops')
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 200)
+
+
+class SQLInstrumentationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        shop = Shop.objects.create(name='Связной', user=User.objects.create_user(email='shop@example.com'))
+        PriceListImporter(shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+
+    @override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_headers_and_log(self):
+        with self.assertLogs('backend.sql', 'INFO') as logs, CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(reverse('backend:products'))
+
+        self.assertEqual(response['X-DB-Queries'], str(len(queries)))
+        self.assertEqual(response['X-DB-N-Plus-One'], '0')
+        self.assertRegex(response['Server-Timing'], rf'^db;dur=[\d.]+;desc="{len(queries)} queries"$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['path'], record['status'], record['queries']), ('/api/v1/products', 200, len(queries)))
+        self.assertEqual(len(record['slowest']), 3)
+
+    def test_disabled(self):
+        response = APIClient().get(reverse('backend:products'))
+
+        self.assertNotIn('X-DB-Queries', response)
+
+    def test_n_plus_one(self):
+        recorder = QueryRecorder(slow_queries=2)
+        with connection.execute_wrapper(recorder):
+            for product_info in ProductInfo.objects.all():
+                list(product_info.product_parameters.all())
+
+        self.assertEqual(recorder.count, 4)
+        [(sql, count)] = recorder.n_plus_one(threshold=3)
+        self.assertIn('backend_productparameter', sql)
+        self.assertEqual(count, 3)
+        self.assertEqual(len(recorder.slowest), 2)
+
+
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILING_ON_DEMAND=True, PROFILING_DIR=directory.name, PROFILING_MAX_PROFILES=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        shop = Shop.objects.create(name='Связной', user=User.objects.create_user(email='shop@example.com'))
+        PriceListImporter(shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+        staff = User.objects.create_user(email='staff@example.com', is_active=True, is_staff=True)
+        self.staff = APIClient(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=staff).key}')
+        user = User.objects.create_user(email='buyer@example.com', is_active=True)
+        self.user = APIClient(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+    def test_on_demand(self):
+        response = self.staff.get(reverse('backend:products'), {'profile': 1})
+        profile_id = response['X-Profile-Id']
+
+        profile = self.staff.get(reverse('backend:profile', args=[profile_id])).json()
+        self.assertEqual((profile['path'], profile['status'], profile['user']),
+                         ('/api/v1/products?profile=1', 200, 'staff@example.com'))
+        self.assertEqual(set(profile['phases']), {'view', 'render'})
+        self.assertRegex(profile['phases']['view']['stats'], r'backend/views.py:\d+\(get\)')
+        self.assertTrue(profile['allocations'])
+
+        response = self.staff.get(reverse('backend:profile-stats', args=[profile_id, 'view']))
+        with TemporaryDirectory() as directory:
+            path = f'{directory}/view.prof'
+            with open(path, 'wb') as file:
+                file.write(b''.join(response.streaming_content))
+            self.assertTrue(Stats(path).total_calls)
+
+    def test_staff_only(self):
+        response = self.user.get(reverse('backend:products'), {'profile': 1})
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.staff.get(reverse('backend:products'), {'profile': 1})
+        [profile] = self.staff.get(reverse('backend:profiles')).json()
+        for path in [reverse('backend:profiles'), reverse('backend:profile', args=[profile['id']]),
+                     reverse('backend:profile-stats', args=[profile['id'], 'view'])]:
+            self.assertEqual(self.user.get(path).status_code, 403)
+            self.assertEqual(APIClient().get(path).status_code, 403)
+
+    def test_ring_buffer(self):
+        ids = [self.staff.get(reverse('backend:products'), HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+
+        profiles = self.staff.get(reverse('backend:profiles')).json()
+        self.assertEqual([profile['id'] for profile in profiles], ids[:0:-1])
+        self.assertEqual(self.staff.get(reverse('backend:profile', args=[ids[0]])).status_code, 404)
+
+    @override_settings(PROFILING_ON_DEMAND=False)
+    def test_disabled(self):
+        response = self.staff.get(reverse('backend:products'), {'profile': 1})
+
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class BasketViewTest(TestCase):
+
+    def setUp(self):
+        shop_user = User.objects.create_user(email='shop@example.com', password='password', type='shop')
+        self.shop = Shop.objects.create(name='Связной', user=shop_user)
+        PriceListImporter(self.shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+        self.offers = dict(ProductInfo.objects.values_list('external_id', 'id'))
+        self.user = User.objects.create_user(email='buyer@example.com', password='password', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, items):
+        return self.client.post(reverse('backend:basket'), {'items': json.dumps(items)}).json()
+
+    def basket(self):
+        return self.client.get(reverse('backend:basket')).json()[0]
+
+    def test_stored_totals(self):
+        self.add([{'product_info': self.offers[4216292], 'quantity': 1},
+                  {'product_info': self.offers[4672670], 'quantity': 2}])
+        self.assertEqual(self.basket()['total_sum'], 110000 + 2 * 12000)
+
+        # последующий импорт не меняет цену уже добавленных позиций
+        ProductInfo.objects.update(price=1)
+        self.assertEqual(self.basket()['total_sum'], 110000 + 2 * 12000)
+
+        item_ids = {item['product_info']['id']: item['id'] for item in self.basket()['ordered_items']}
+        self.client.put(reverse('backend:basket'), {
+            'items': json.dumps([{'id': item_ids[self.offers[4672670]], 'quantity': 3}])})
+        self.assertEqual(self.basket()['total_sum'], 110000 + 3 * 12000)
+
+        self.client.delete(reverse('backend:basket'), {'items': str(item_ids[self.offers[4216292]])})
+        self.assertEqual(self.basket()['total_sum'], 3 * 12000)
+
+    def test_bulk_add(self):
+        items = [{'product_info': product_info_id, 'quantity': 1} for product_info_id in self.offers.values()]
+        with self.assertNumQueries(10):
+            response = self.add(items)
+        self.assertEqual(response, {'Status': True, 'Создано объектов': 3, 'Обновлено объектов': 0})
+
+        response = self.add([{'product_info': self.offers[4216292], 'quantity': 2}])
+        self.assertEqual(response, {'Status': True, 'Создано объектов': 0, 'Обновлено объектов': 1})
+        quantities = {item['product_info']['id']: item['quantity'] for item in self.basket()['ordered_items']}
+        self.assertEqual(quantities[self.offers[4216292]], 3)
+
+    def test_bulk_add_errors(self):
+        response = self.add([{'product_info': self.offers[4216292], 'quantity': 1},
+                             {'product_info': 0, 'quantity': 1},
+                             {'product_info': self.offers[4216313], 'quantity': 'много'}])
+
+        self.assertFalse(response['Status'])
+        self.assertEqual(set(response['Errors']), {'1', '2'})
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_string_values(self):
+        # как и прежний OrderItemSerializer, корзина принимает идентификаторы и количества строками
+        response = self.add([{'product_info': str(self.offers[4216292]), 'quantity': '2'}])
+        self.assertEqual(response, {'Status': True, 'Создано объектов': 1, 'Обновлено объектов': 0})
+
+        item_id = OrderItem.objects.get().id
+        response = self.client.put(reverse('backend:basket'), {
+            'items': json.dumps([{'id': str(item_id), 'quantity': '4'}])}).json()
+        self.assertEqual(response, {'Status': True, 'Обновлено объектов': 1})
+        self.assertEqual(OrderItem.objects.get().quantity, 4)
+
+        response = self.client.put(reverse('backend:basket'), {
+            'items': json.dumps([{'id': str(item_id), 'quantity': '4'}, {'id': 'x', 'quantity': 1},
+                                 {'id': True, 'quantity': 1}])}).json()
+        self.assertEqual(set(response['Errors']), {'1', '2'})
+
+        response = self.client.put(reverse('backend:basket'), {
+            'items': json.dumps([{'id': str(item_id), 'quantity': '4'}, {'id': '0', 'quantity': 1}])}).json()
+        self.assertEqual(response['Errors'], {'1': 'Позиция не найдена в корзине'})
+
+    def test_batched_update(self):
+        self.add([{'product_info': product_info_id, 'quantity': 1} for product_info_id in self.offers.values()])
+        item_ids = list(OrderItem.objects.values_list('id', flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(reverse('backend:basket'), {
+                'items': json.dumps([{'id': item_id, 'quantity': 5} for item_id in item_ids])}).json()
+        self.assertEqual(response, {'Status': True, 'Обновлено объектов': 3})
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "backend_orderitem"')]), 1)
+        self.assertEqual(set(OrderItem.objects.values_list('quantity', flat=True)), {5})
+
+        foreign = Order.objects.create(user=User.objects.create_user(email='other@example.com'), state='basket')
+        foreign_item = OrderItem.objects.create(order=foreign, product_info_id=self.offers[4216292], quantity=1)
+        response = self.client.put(reverse('backend:basket'), {
+            'items': json.dumps([{'id': item_ids[0], 'quantity': 2}, {'id': foreign_item.id, 'quantity': 2}])}).json()
+        self.assertEqual(response, {'Status': False, 'Errors': {'1': 'Позиция не найдена в корзине'}})
+        self.assertEqual(OrderItem.objects.get(id=item_ids[0]).quantity, 5)
+
+
+class PartnerOrdersTest(TestCase):
+
+    def setUp(self):
+        self.shops = []
+        for email in ['shop@example.com', 'other@example.com']:
+            shop_user = User.objects.create_user(email=email, password='password', type='shop', is_active=True)
+            shop = Shop.objects.create(name=email, user=shop_user)
+            PriceListImporter(shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+            self.shops.append(shop)
+        buyer = User.objects.create_user(email='buyer@example.com', password='password', is_active=True)
+        contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+        self.order = Order.objects.create(user=buyer, state='basket')
+        for shop, external_id, quantity in [(self.shops[0], 4216292, 1), (self.shops[0], 4672670, 2),
+                                            (self.shops[1], 4216313, 1)]:
+            OrderItem.objects.create(order=self.order, quantity=quantity,
+                                     product_info=ProductInfo.objects.get(shop=shop, external_id=external_id))
+        self.assertFalse(ShopOrder.objects.exists())
+
+        client = APIClient()
+        client.force_authenticate(buyer)
+        response = client.post(reverse('backend:order'), {'id': str(self.order.id), 'contact': contact.id})
+        self.assertTrue(response.json()['Status'])
+
+    def partner_orders(self, shop):
+        client = APIClient()
+        client.force_authenticate(shop.user)
+        return client.get(reverse('backend:partner-orders')).json()
+
+    def test_shop_lines_and_subtotal(self):
+        with self.assertNumQueries(4):
+            orders = self.partner_orders(self.shops[0])
+
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0]['id'], self.order.id)
+        self.assertEqual(orders[0]['state'], 'new')
+        self.assertEqual(orders[0]['total_sum'], 110000 + 2 * 12000)
+        self.assertEqual(sorted(item['product_info']['model'] for item in orders[0]['ordered_items']),
+                         ['apple/airpods', 'apple/iphone/xs-max'])
+        self.assertEqual([item['product_info']['model'] for item in self.partner_orders(self.shops[1])[0][
+            'ordered_items']], ['apple/iphone/xr'])
+
+    def test_state_change(self):
+        self.order.state = 'confirmed'
+        self.order.save()
+
+        self.assertEqual(set(ShopOrder.objects.values_list('state', flat=True)), {'confirmed'})
+        self.assertEqual(self.partner_orders(self.shops[1])[0]['state'], 'confirmed')
+
+
+class QueryPlanTest(TestCase):
+    """
+    Проверяет по EXPLAIN, что частые запросы представлений используют индексы
+    """
+
+    def setUp(self):
+        shop_user = User.objects.create_user(email='shop@example.com', password='password', type='shop')
+        self.shop = Shop.objects.create(name='Связной', user=shop_user)
+        PriceListImporter(self.shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+        self.user = User.objects.create_user(email='buyer@example.com', password='password', is_active=True)
+        for state in ['basket', 'new']:
+            order = Order.objects.create(user=self.user, state=state)
+            OrderItem.objects.create(order=order, product_info=ProductInfo.objects.first(), quantity=1)
+
+    def assertNoFullScan(self, name, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            full_scans = re.findall(r'Seq Scan on (\w+)', plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            # SCAN без индекса - полный просмотр таблицы
+            full_scans = re.findall(r'\bSCAN (\w+)\s*$', plan, re.MULTILINE)
+        else:
+            self.skipTest(f'EXPLAIN не разбирается для {connection.vendor}')
+        self.assertFalse(full_scans, f'{name}: полный просмотр {", ".join(full_scans)}\n{plan}')
+
+    @skipUnlessDBFeature('supports_explaining_query_execution')
+    def test_hot_queries(self):
+        shop_id, user_id = self.shop.id, self.user.id
+        queries = {
+            'basket': Order.objects.filter(user_id=user_id, state='basket'),
+            'orders': Order.objects.filter(user_id=user_id).exclude(state='basket'),
+            'basket items': OrderItem.objects.filter(order_id=1),
+            'partner orders': ShopOrder.objects.filter(shop__user_id=self.shop.user_id),
+            'shops': Shop.objects.filter(state=True),
+            'products by shop': ProductInfo.objects.filter(
+                shop__state=True, is_active=True, shop_id=shop_id).order_by('id')[:41],
+            'products by category': ProductInfo.objects.filter(
+                shop__state=True, is_active=True, product__category_id=15).order_by('id')[:41],
+            'products next page': ProductInfo.objects.filter(
+                shop__state=True, is_active=True, id__gt=1).order_by('id')[:41],
+            'product parameters': ProductParameter.objects.filter(product_info_id__in=[1, 2]),
+            'parameter filter': ProductParameter.objects.filter(parameter__name='Цвет', value='золотистый'),
+            'facets': FacetCount.objects.filter(shop_id=shop_id, category_id=15),
+            'import products': Product.objects.filter(name='Смартфон Apple iPhone XR', category_id=224),
+            'import offers': ProductInfo.objects.filter(shop_id=shop_id, external_id=4216292),
+            'email outbox': OutboxEmail.objects.filter(state='pending', next_attempt_at__lte=timezone.now()),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(name):
+                self.assertNoFullScan(name, queryset)
+
+
+class FastSerializerTest(TestCase):
+
+    def setUp(self):
+        shop_user = User.objects.create_user(email='shop@example.com', password='password', type='shop')
+        self.shop = Shop.objects.create(name='Связной', user=shop_user)
+        PriceListImporter(self.shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+        self.user = user = User.objects.create_user(email='buyer@example.com', password='password', is_active=True)
+        contact = Contact.objects.create(user=user, city='Москва', street='Тверская', phone='+79990000000')
+        for contact in [contact, None]:
+            order = Order.objects.create(user=user, state='new', contact=contact)
+            for product_info in ProductInfo.objects.all():
+                OrderItem.objects.create(order=order, product_info=product_info, quantity=2)
+
+    def assertSameJSON(self, serializer_class, fast_serializer_class, objects):
+        objects = list(objects)
+        self.assertEqual(JSONRenderer().render(fast_serializer_class(objects, many=True).data),
+                         JSONRenderer().render(serializer_class(objects, many=True).data))
+        self.assertEqual(fast_serializer_class(objects[0]).data, serializer_class(objects[0]).data)
+
+    def test_product_info(self):
+        self.assertSameJSON(ProductInfoSerializer, ProductInfoFastSerializer, ProductInfo.objects.select_related(
+            'product__category').prefetch_related('product_parameters__parameter'))
+
+    def test_order(self):
+        self.assertSameJSON(OrderSerializer, OrderFastSerializer, Order.objects.select_related(
+            'contact').prefetch_related('ordered_items__product_info__product__category',
+                                        'ordered_items__product_info__product_parameters__parameter'))
+
+    @override_settings(STREAM_CHUNK_SIZE=1)
+    def test_order_streaming(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = client.get(reverse('backend:order')).json()
+
+        response = client.get(reverse('backend:order'), {'stream': 1})
+
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), expected)
+
+
+class ORJSONRendererTest(TestCase):
+    data = {
+        'Status': True,
+        'Создано объектов': 2,
+        'dt': datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'price': Decimal('10.50'),
+        'items': [{'id': 1, 'value': 'строка\u2028с разделителем'}],
+    }
+
+    def test_renderer_matches_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(self.data, 'application/json; indent=4'),
+                         JSONRenderer().render(self.data, 'application/json; indent=4'))
+        self.assertEqual(ORJSONRenderer().render({'id': 2 ** 70}), JSONRenderer().render({'id': 2 ** 70}))
+
+    def test_parser(self):
+        body = JSONRenderer().render({'Создано объектов': 2, 'items': [1, 'два']})
+        self.assertEqual(ORJSONParser().parse(BytesIO(body)), {'Создано объектов': 2, 'items': [1, 'два']})
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password', is_active=True)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_lookup(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get(reverse('backend:user-details')).status_code, 200)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get(reverse('backend:user-details')).status_code, 200)
+
+        self.assertEqual(len(second), len(first) - 1)
+        self.assertEqual(token_cache.stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_invalidation(self):
+        self.client.get(reverse('backend:user-details'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('backend:user-details')).status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.client.get(reverse('backend:user-details'))
+        self.token.delete()
+        self.assertEqual(self.client.get(reverse('backend:user-details')).status_code, 401)
+
+
+class EagerCeleryMixin:
+    """
+    Выполняет задачи Celery синхронно в процессе теста
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.task_always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=cls.task_always_eager)
+        super().tearDownClass()
+
+
+class FailingEmailBackend(EmailBackend):
+    """
+    Почтовый бэкенд, отклоняющий письма на адреса домена fail.example.com
+    """
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@fail.example.com') for address in message.to):
+                raise ConnectionError('Connection refused')
+            # состояние письма в базе на момент отправки
+            message.outbox_state = OutboxEmail.objects.get(to=message.to).state
+        return super().send_messages(messages)
+
+
+class OutboxEmailTest(EagerCeleryMixin, TestCase):
+
+    def test_signal_queues_email(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(email='buyer@example.com', password='password')
+            self.assertEqual(len(mail.outbox), 0)
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.state, 'sent')
+        self.assertEqual(email.to, ['buyer@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+
+    @override_settings(EMAIL_BACKEND='backend.tests.FailingEmailBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_retry_with_backoff(self):
+        for address in ['first@example.com', 'second@fail.example.com', 'third@example.com']:
+            OutboxEmail.objects.create(subject='Тема', body='Текст', from_email='shop@example.com', to=[address])
+
+        self.assertEqual(deliver_outbox(batch_size=2), 3)
+        self.assertEqual([message.to for message in mail.outbox], [['first@example.com'], ['third@example.com']])
+        failed = OutboxEmail.objects.get(state='pending')
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('Connection refused', failed.last_error)
+        self.assertGreater(failed.next_attempt_at, failed.created_at)
+
+        # письмо еще не готово к повторной отправке
+        self.assertEqual(deliver_outbox(), 0)
+
+        OutboxEmail.objects.update(next_attempt_at=failed.created_at)
+        self.assertEqual(deliver_outbox(), 1)
+        failed.refresh_from_db()
+        self.assertEqual(failed.state, 'failed')
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual({message.outbox_state for message in mail.outbox}, {'sending'})
+
+    def test_stale_sending(self):
+        email = OutboxEmail.objects.create(subject='Тема', body='Текст', from_email='shop@example.com',
+                                           to=['buyer@example.com'], state='sending',
+                                           next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(deliver_outbox(), 0)
+
+        OutboxEmail.objects.update(next_attempt_at=email.created_at)
+        self.assertEqual(deliver_outbox(), 1)
+        self.assertEqual(OutboxEmail.objects.get().state, 'sent')
+
+    def test_broker_outage(self):
+        def delay():
+            raise ConnectionError('Connection refused')
+
+        # вне тестов ошибку робастного обработчика пишет журнал django.db.backends.base
+        with mock.patch('backend.tasks.send_email.delay', delay), self.assertLogs('django.test', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(email='buyer@example.com', password='password')
+
+        self.assertEqual(OutboxEmail.objects.get().state, 'pending')
+
+
+@mock.patch('backend.views.new_order')
+class StockReservationTest(EagerCeleryMixin, TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        shop = Shop.objects.create(name='Связной', user=User.objects.create_user(email='shop@example.com'))
+        PriceListImporter(shop).run(load_yaml(PRICE_LIST, Loader=Loader))
+        self.offers = dict(ProductInfo.objects.values_list('external_id', 'id'))
+
+    def basket(self, email, items):
+        user = User.objects.create_user(email=email, is_active=True)
+        contact = Contact.objects.create(user=user, city='Москва', street='Тверская', phone='+79990000000')
+        order = Order.objects.create(user=user, state='basket')
+        for external_id, quantity in items:
+            OrderItem.objects.create(order=order, product_info_id=self.offers[external_id], quantity=quantity)
+        # исключение запроса в одном потоке тестовый клиент передает клиентам всех потоков,
+        # поэтому ошибки проверяются по коду ответа
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        return client, {'id': str(order.id), 'contact': contact.id}
+
+    def quantity(self, external_id):
+        return ProductInfo.objects.get(id=self.offers[external_id]).quantity
+
+    def test_reserve_and_cancel(self, new_order):
+        client, data = self.basket('buyer@example.com', [(4216292, 2), (4672670, 3)])
+        quantities = {external_id: self.quantity(external_id) for external_id in [4216292, 4672670]}
+
+        self.assertTrue(client.post(reverse('backend:order'), data).json()['Status'])
+        self.assertEqual(self.quantity(4216292), quantities[4216292] - 2)
+        self.assertEqual(self.quantity(4672670), quantities[4672670] - 3)
+        # повторное оформление того же заказа не списывает товар еще раз
+        self.assertFalse(client.post(reverse('backend:order'), data).json()['Status'])
+        self.assertEqual(self.quantity(4216292), quantities[4216292] - 2)
+
+        self.assertTrue(Order.cancel(int(data['id'])))
+        self.assertFalse(Order.cancel(int(data['id'])))
+        self.assertEqual({external_id: self.quantity(external_id) for external_id in quantities}, quantities)
+        self.assertEqual(set(ShopOrder.objects.values_list('state', flat=True)), {'canceled'})
+
+        form = OrderAdminForm({'user': Order.objects.get(id=data['id']).user_id, 'state': 'new', 'total_sum': 0},
+                              instance=Order.objects.get(id=data['id']))
+        self.assertIn('state', form.errors)
+
+    def test_cancel_without_reservation(self, new_order):
+        quantity = self.quantity(4216292)
+        client, data = self.basket('buyer@example.com', [(4216292, 2)])
+        # заказ, оформленный в админке или до появления резерва, товар не списывал
+        Order.objects.filter(id=data['id']).update(state='new')
+
+        self.assertTrue(Order.cancel(int(data['id'])))
+        self.assertEqual(self.quantity(4216292), quantity)
+
+    def test_out_of_stock(self, new_order):
+        quantity = self.quantity(4216292)
+        client, data = self.basket('buyer@example.com', [(4216292, 1), (4672670, self.quantity(4672670) + 1)])
+
+        response = client.post(reverse('backend:order'), data).json()
+
+        self.assertEqual(response['product_info'], self.offers[4672670])
+        self.assertEqual(self.quantity(4216292), quantity)
+        self.assertEqual(Order.objects.get(id=data['id']).state, 'basket')
+        new_order.send.assert_not_called()
+
+    def test_concurrent_checkout(self, new_order):
+        buyers, stock = 20, 5
+        ProductInfo.objects.filter(id=self.offers[4216292]).update(quantity=stock)
+        baskets = [self.basket(f'buyer{number}@example.com', [(4216292, 1)]) for number in range(buyers)]
+        barrier = Barrier(buyers)
+        results = []
+
+        def checkout(client, data):
+            barrier.wait()
+            try:
+                # SQLite блокирует запись во всю таблицу и сразу отвечает database table is locked:
+                # транзакция откатывается с ответом 500, и покупатель повторяет запрос
+                for attempt in range(100):
+                    response = client.post(reverse('backend:order'), data)
+                    if response.status_code != 500:
+                        results.append(response.json()['Status'])
+                        return
+                    sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=checkout, args=basket) for basket in baskets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), buyers)
+        self.assertEqual(results.count(True), stock)
+        self.assertEqual(self.quantity(4216292), 0)
+        self.assertEqual(Order.objects.filter(state='new').count(), stock)
+        self.assertEqual(new_order.send.call_count, stock)
+
+
+class PartnerUpdateTest(EagerCeleryMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='password', type='shop',
+                                             is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def update(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('backend:partner-update'), {'url': url})
+        self.assertTrue(response.json()['Status'])
+        return self.client.get(reverse('backend:partner-update-status', args=[response.json()['Job']])).json()
+
+    def test_streaming_import(self):
+        with PriceListServer(PRICE_LIST) as server:
+            job = self.update(server.url)
+
+        self.assertEqual(job['state'], 'done')
+        self.assertEqual(job['processed'], 3)
+        self.assertEqual(job['stats']['inserted'], 3)
+        self.assertEqual(ProductInfo.objects.filter(shop__user=self.user).count(), 3)
+
+    def test_goods_before_header(self):
+        header, goods = PRICE_LIST.split('\ngoods:')
+        shop, categories = header.split('\ncategories:')
+        with PriceListServer(f'{shop}\ngoods:{goods}\ncategories:{categories}') as server:
+            job = self.update(server.url)
+
+        self.assertEqual(job['state'], 'done')
+        self.assertEqual(job['stats']['inserted'], 3)
+        self.assertEqual(Category.objects.count(), 2)
+
+        with self.assertRaisesMessage(PriceListError, 'goods должны идти после shop и categories'):
+            PriceListReader(f'goods:{goods}\nshop: Связной').read()
+
+    def test_broker_outage(self):
+        def delay(job_id):
+            raise ConnectionError('Connection refused')
+
+        with mock.patch('backend.views.do_import.delay', delay):
+            response = self.client.post(reverse('backend:partner-update'), {'url': 'http://example.com/shop.yaml'})
+
+        self.assertFalse(response.json()['Status'])
+        self.assertIn('Connection refused', response.json()['Errors'])
+        job = ImportJob.objects.get()
+        self.assertEqual(job.state, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_missing_goods(self):
+        with PriceListServer(PRICE_LIST) as server:
+            self.update(server.url)
+            server.body = PRICE_LIST.replace('\ngoods:', '\nGoods:')
+            job = self.update(server.url)
+
+        self.assertEqual(job['state'], 'failed')
+        self.assertIn('goods', job['errors'])
+        self.assertEqual(ProductInfo.objects.filter(shop__user=self.user, is_active=True, quantity__gt=0).count(), 3)
+
+        data = PriceListReader(PRICE_LIST.split('\ngoods:')[0] + '\ngoods: []').read()
+        self.assertEqual(list(data['goods']), [])
+
+    @override_settings(IMPORT_MAX_SIZE=512, IMPORT_CHUNK_SIZE=128)
+    def test_max_size(self):
+        with PriceListServer(PRICE_LIST) as server:
+            job = self.update(server.url)
+
+        self.assertEqual(job['state'], 'failed')
+        self.assertIn('512', job['errors'])
+        self.assertFalse(ProductInfo.objects.exists())
+
+    def test_not_modified(self):
+        with PriceListServer(PRICE_LIST, etag='"v1"') as server:
+            self.update(server.url)
+            job = self.update(server.url)
+
+        self.assertEqual(server.requests[1]['If-None-Match'], '"v1"')
+        self.assertEqual(job['state'], 'skipped')
+        self.assertEqual(Shop.objects.get(user=self.user).etag, '"v1"')
+
+    def test_same_digest(self):
+        with PriceListServer(PRICE_LIST) as server:
+            self.update(server.url)
+            ProductInfo.objects.update(price=1)
+            job = self.update(server.url)
+            self.assertEqual(job['state'], 'skipped')
+            self.assertFalse(ProductInfo.objects.exclude(price=1).exists())
+
+            server.body = PRICE_LIST.replace('quantity: 9', 'quantity: 8')
+            job = self.update(server.url)
+
+        self.assertEqual(job['state'], 'done')
+        self.assertEqual(job['stats']['updated'], 3)
+
+    def test_shared_cache_check(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem, CELERY_TASK_ALWAYS_EAGER=False):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['backend.E001'])
+        with override_settings(CACHES=locmem, CELERY_TASK_ALWAYS_EAGER=True):
+            self.assertEqual(check_shared_cache(None), [])
+        filebased = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                 'LOCATION': '/tmp/backend-tests'}}
+        with override_settings(CACHES=filebased, CELERY_TASK_ALWAYS_EAGER=False):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_foreign_job(self):
+        job = ImportJob.objects.create(user=User.objects.create_user(email='other@example.com', type='shop'),
+                                       url='http://127.0.0.1/shop.yaml')
+
+        response = self.client.get(reverse('backend:partner-update-status', args=[job.id]))
+
+        self.assertEqual(response.status_code, 404)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(EagerCeleryMixin, TestCase):
+
+    def test_request_metrics(self):
+        before = sample('http_requests_total', view='basket', method='GET', status='403')
+        count = sample('http_request_duration_seconds_count', view='basket', method='GET')
+
+        APIClient().get(reverse('backend:basket'))
+        APIClient().get('/missing')
+
+        self.assertEqual(sample('http_requests_total', view='basket', method='GET', status='403'), before + 1)
+        self.assertEqual(sample('http_request_duration_seconds_count', view='basket', method='GET'), count + 1)
+        self.assertTrue(sample('http_requests_total', view='unmatched', method='GET', status='404'))
+        content = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_requests_total{method="GET",status="403",view="basket"}', content)
+        self.assertIn('http_request_duration_seconds_bucket{le="0.005",method="GET",view="basket"}', content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_import_email_and_cache_metrics(self):
+        token_cache.clear()
+        cache.clear()
+        user = User.objects.create_user(email='shop@example.com', type='shop', is_active=True)
+        client = APIClient(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        imports = sample('price_list_imports_total', state='done')
+        inserted = sample('price_list_import_rows_total', kind='inserted')
+        token = [sample('cache_requests_total', cache='token', result=result) for result in ['hit', 'miss']]
+        catalogue = [sample('cache_requests_total', cache='catalogue', result=result) for result in ['hit', 'miss']]
+        emails = sample('emails_total', result='sent')
+
+        with PriceListServer(PRICE_LIST) as server, self.captureOnCommitCallbacks(execute=True):
+            client.post(reverse('backend:partner-update'), {'url': server.url})
+        client.get(reverse('backend:shops'))
+        client.get(reverse('backend:shops'))
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(email='buyer@example.com', password='password')
+
+        self.assertEqual(sample('price_list_imports_total', state='done'), imports + 1)
+        self.assertEqual(sample('price_list_import_rows_total', kind='inserted'), inserted + 3)
+        self.assertEqual(sample('cache_requests_total', cache='token', result='hit'), token[0] + 2)
+        self.assertEqual(sample('cache_requests_total', cache='token', result='miss'), token[1] + 1)
+        self.assertEqual(sample('cache_requests_total', cache='catalogue', result='hit'), catalogue[0] + 1)
+        self.assertEqual(sample('cache_requests_total', cache='catalogue', result='miss'), catalogue[1] + 1)
+        self.assertEqual(sample('emails_total', result='sent'), emails + 1)
+        self.assertTrue(sample('email_send_duration_seconds_count'))
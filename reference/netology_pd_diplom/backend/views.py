@@ -1,25 +1,35 @@
 from distutils.util import strtobool
 from rest_framework.request import Request
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
-from django.db import IntegrityError
-from django.db.models import Q, Sum, F
-from django.http import JsonResponse
-from requests import get
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.db.models import Q, Case, When, Value, IntegerField, PositiveIntegerField, Prefetch
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from ujson import loads as load_json
-from yaml import load as load_yaml, Loader
 
-from backend.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken
-from backend.serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoSerializer, \
-    OrderItemSerializer, OrderSerializer, ContactSerializer
+from backend.cache import conditional_response, get_cached_response, invalidate_on_commit, order_scopes, \
+    shop_scopes
+from backend.facets import parameter_filter_query, parse_parameter_filters, precomputed_facets, \
+    queryset_facets
+from backend.metrics import export as export_metrics
+from backend.models import Shop, Category, ProductInfo, Order, OrderItem, Contact, ConfirmEmailToken, ImportJob, \
+    ShopOrder, OutOfStock
+from backend.pagination import ProductInfoPagination
+from backend.profiling import get_profile, get_profile_stats_path, list_profiles
+from backend.renderers import StreamingJsonResponse
+from backend.search import search_product_infos
+from backend.serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoFastSerializer, \
+    OrderFastSerializer, ShopOrderFastSerializer, ContactSerializer, ImportJobSerializer
 from backend.signals import new_user_registered, new_order
+from backend.tasks import do_import
 
 
 class RegisterAccount(APIView):
@@ -197,20 +207,57 @@ class LoginAccount(APIView):
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
-class CategoryView(ListAPIView):
+def is_streaming(request):
+    """
+    Проверяет, запрошен ли потоковый ответ (?stream=1)
+    """
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def to_int(value):
+    """
+    Приводит идентификатор или количество позиции к int: как и IntegerField
+    сериализатора, принимает числа и строки из цифр. Возвращает None для других значений
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+class CachedListMixin:
+    """
+    Кеширует ответ списка до изменения областей каталога cache_scopes и отвечает 304 на условные запросы
+    """
+    cache_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        name = self.__class__.__name__
+
+        def build():
+            return super(CachedListMixin, self).list(request, *args, **kwargs).data
+
+        return conditional_response(request, name, self.cache_scopes, lambda: Response(
+            get_cached_response(request, name, self.cache_scopes, build)))
+
+
+class CategoryView(CachedListMixin, ListAPIView):
     """
     Класс для просмотра категорий
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_scopes = ('categories',)
 
 
-class ShopView(ListAPIView):
+class ShopView(CachedListMixin, ListAPIView):
     """
     Класс для просмотра списка магазинов
     """
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
+    cache_scopes = ('shops',)
 
 
 class ProductInfoView(APIView):
@@ -218,7 +265,8 @@ class ProductInfoView(APIView):
         A class for searching products.
 
         Methods:
-        - get: Retrieve the product information based on the specified filters.
+        - get: Retrieve the product information based on the specified filters and full-text search,
+          with product counts per parameter value.
 
         Attributes:
         - None
@@ -226,17 +274,21 @@ class ProductInfoView(APIView):
 
     def get(self, request: Request, *args, **kwargs):
         """
-               Retrieve the product information based on the specified filters.
+               Retrieve a page of product information based on the specified filters.
 
                Args:
                - request (Request): The Django request object.
 
                Returns:
-               - Response: The response containing the product information.
+               - Response: The response containing the product information and the next/previous page cursors,
+                 or a StreamingJsonResponse with all matching products when ?stream=1 is passed;
+                 304 Not Modified when the ETag in If-None-Match is still current.
                """
-        query = Q(shop__state=True)
+        query = Q(shop__state=True, is_active=True)
         shop_id = request.query_params.get('shop_id')
         category_id = request.query_params.get('category_id')
+        search = request.query_params.get('search')
+        parameters = parse_parameter_filters(request.query_params.getlist('parameter'))
 
         if shop_id:
             query = query & Q(shop_id=shop_id)
@@ -244,15 +296,63 @@ class ProductInfoView(APIView):
         if category_id:
             query = query & Q(product__category_id=category_id)
 
-        # фильтруем и отбрасываем дуликаты
-        queryset = ProductInfo.objects.filter(
-            query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
-
-        serializer = ProductInfoSerializer(queryset, many=True)
+        if parameters:
+            query = query & parameter_filter_query(parameters)
+
+        def get_queryset():
+            # фильтруем по внешним ключам, поэтому дубликатов нет и distinct не нужен
+            queryset = ProductInfo.objects.filter(
+                query).select_related(
+                'product__category').prefetch_related(
+                'product_parameters__parameter')
+            ordering = 'id'
+
+            if search:
+                ids = search_product_infos(search, settings.SEARCH_MAX_RESULTS, ProductInfo.objects.filter(query))
+                if ids is None:
+                    # СУБД без полнотекстового индекса
+                    queryset = queryset.filter(
+                        Q(product__name__icontains=search) | Q(model__icontains=search) |
+                        Q(product_parameters__value__icontains=search)).distinct()
+                elif ids:
+                    # сохраняем порядок релевантности из индекса
+                    queryset = queryset.filter(id__in=ids).annotate(search_rank=Case(
+                        *[When(id=pk, then=Value(rank)) for rank, pk in enumerate(ids)],
+                        output_field=IntegerField()))
+                    ordering = 'search_rank'
+                else:
+                    queryset = queryset.none()
+            return queryset, ordering
+
+        def stream():
+            queryset, ordering = get_queryset()
+            return StreamingJsonResponse(queryset.order_by(ordering), ProductInfoFastSerializer)
+
+        def build():
+            queryset, ordering = get_queryset()
+            paginator = ProductInfoPagination()
+            paginator.ordering = ordering
+
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = ProductInfoFastSerializer(page, many=True)
+            data = paginator.get_paginated_response(serializer.data).data
+
+            # количество по значениям параметров отдается только на первой странице
+            if paginator.cursor_query_param not in request.query_params:
+                if search or parameters:
+                    data['facets'] = queryset_facets(queryset)
+                else:
+                    data['facets'] = precomputed_facets(shop_id, category_id)
+            return data
 
-        return Response(serializer.data)
+        scopes = [f'shop:{shop_id}'] if shop_id else []
+        if category_id:
+            scopes.append(f'category:{category_id}')
+        scopes = scopes or ['products']
+        if is_streaming(request):
+            return conditional_response(request, 'products', scopes, stream)
+        return conditional_response(request, 'products', scopes, lambda: Response(
+            get_cached_response(request, 'products', scopes, build)))
 
 
 class BasketView(APIView):
@@ -285,16 +385,18 @@ class BasketView(APIView):
         basket = Order.objects.filter(
             user_id=request.user.id, state='basket').prefetch_related(
             'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+            'ordered_items__product_info__product_parameters__parameter')
 
-        serializer = OrderSerializer(basket, many=True)
+        serializer = OrderFastSerializer(basket, many=True)
         return Response(serializer.data)
 
     # редактировать корзину
     def post(self, request, *args, **kwargs):
         """
-               Add an items to the user's basket.
+               Add items to the user's basket in one transaction.
+
+               All product_info ids are checked with a single query; quantities of items already
+               in the basket are merged. Nothing is written if any item is invalid.
 
                Args:
                - request (Request): The Django request object.
@@ -312,24 +414,48 @@ class BasketView(APIView):
             except ValueError:
                 return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
             else:
-                basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                objects_created = 0
-                for order_item in items_dict:
-                    order_item.update({'order': basket.id})
-                    serializer = OrderItemSerializer(data=order_item)
-                    if serializer.is_valid():
-                        try:
-                            serializer.save()
-                        except IntegrityError as error:
-                            return JsonResponse({'Status': False, 'Errors': str(error)})
-                        else:
-                            objects_created += 1
-
+                if type(items_dict) != list:
+                    return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
+
+                # проверяем все позиции, цены товаров получаем одним запросом
+                errors = {}
+                quantities = {}
+                product_infos = {}
+                for index, order_item in enumerate(items_dict):
+                    product_info_id = to_int(order_item.get('product_info')) if type(order_item) == dict else None
+                    quantity = to_int(order_item.get('quantity')) if type(order_item) == dict else None
+                    if product_info_id is None or quantity is None or quantity < 1:
+                        errors[index] = 'Неверный формат позиции'
                     else:
+                        product_infos[index] = product_info_id
+                        quantities.setdefault(product_info_id, 0)
+                        quantities[product_info_id] += quantity
+
+                prices = dict(ProductInfo.objects.filter(
+                    id__in=quantities, is_active=True, shop__state=True).values_list('id', 'price'))
+                for index, product_info_id in product_infos.items():
+                    if product_info_id not in prices:
+                        errors[index] = 'Товар не найден или недоступен для заказа'
+                if errors:
+                    return JsonResponse({'Status': False, 'Errors': errors})
 
-                        return JsonResponse({'Status': False, 'Errors': serializer.errors})
+                try:
+                    with transaction.atomic():
+                        basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
+                        existing = list(OrderItem.objects.filter(order_id=basket.id, product_info_id__in=quantities))
+                        for order_item in existing:
+                            order_item.quantity += quantities.pop(order_item.product_info_id)
+                        OrderItem.objects.bulk_update(existing, ['quantity'])
+                        OrderItem.objects.bulk_create([
+                            OrderItem(order_id=basket.id, product_info_id=product_info_id, quantity=quantity,
+                                      price=prices[product_info_id])
+                            for product_info_id, quantity in quantities.items()])
+                        Order.update_total_sum(basket.id)
+                except IntegrityError as error:
+                    return JsonResponse({'Status': False, 'Errors': str(error)})
 
-                return JsonResponse({'Status': True, 'Создано объектов': objects_created})
+                return JsonResponse({'Status': True, 'Создано объектов': len(quantities),
+                                     'Обновлено объектов': len(existing)})
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
     # удалить товары из корзины
@@ -359,13 +485,16 @@ class BasketView(APIView):
 
             if objects_deleted:
                 deleted_count = OrderItem.objects.filter(query).delete()[0]
+                Order.update_total_sum(basket.id)
                 return JsonResponse({'Status': True, 'Удалено объектов': deleted_count})
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
     # добавить позиции в корзину
     def put(self, request, *args, **kwargs):
         """
-               Update the items in the user's basket.
+               Update the quantities of items in the user's basket with a single statement.
+
+               The whole update is rejected if any id is not in the user's basket.
 
                Args:
                - request (Request): The Django request object.
@@ -383,12 +512,38 @@ class BasketView(APIView):
             except ValueError:
                 return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
             else:
+                if type(items_dict) != list:
+                    return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
+
+                errors = {}
+                quantities = {}
+                item_ids = {}
+                for index, order_item in enumerate(items_dict):
+                    order_item_id = to_int(order_item.get('id')) if type(order_item) == dict else None
+                    quantity = to_int(order_item.get('quantity')) if type(order_item) == dict else None
+                    if order_item_id is None or quantity is None or quantity < 1:
+                        errors[index] = 'Неверный формат позиции'
+                    else:
+                        item_ids[index] = order_item_id
+                        quantities[order_item_id] = quantity
+                if errors:
+                    return JsonResponse({'Status': False, 'Errors': errors})
+
                 basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                objects_updated = 0
-                for order_item in items_dict:
-                    if type(order_item['id']) == int and type(order_item['quantity']) == int:
-                        objects_updated += OrderItem.objects.filter(order_id=basket.id, id=order_item['id']).update(
-                            quantity=order_item['quantity'])
+                with transaction.atomic():
+                    # все количества обновляются одним UPDATE ... CASE
+                    objects_updated = OrderItem.objects.filter(order_id=basket.id, id__in=quantities).update(
+                        quantity=Case(*[When(id=order_item_id, then=Value(quantity))
+                                        for order_item_id, quantity in quantities.items()],
+                                      output_field=PositiveIntegerField()))
+                    if objects_updated != len(quantities):
+                        found = set(OrderItem.objects.filter(
+                            order_id=basket.id, id__in=quantities).values_list('id', flat=True))
+                        transaction.set_rollback(True)
+                        errors = {index: 'Позиция не найдена в корзине' for index, order_item_id in item_ids.items()
+                                  if order_item_id not in found}
+                        return JsonResponse({'Status': False, 'Errors': errors})
+                    Order.update_total_sum(basket.id)
 
                 return JsonResponse({'Status': True, 'Обновлено объектов': objects_updated})
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
@@ -407,13 +562,13 @@ class PartnerUpdate(APIView):
 
     def post(self, request, *args, **kwargs):
         """
-                Update the partner price list information.
+                Queue an import of the partner price list.
 
                 Args:
                 - request (Request): The Django request object.
 
                 Returns:
-                - JsonResponse: The response indicating the status of the operation and any errors.
+                - JsonResponse: The response containing the import job id or errors.
                 """
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
@@ -429,37 +584,59 @@ class PartnerUpdate(APIView):
             except ValidationError as e:
                 return JsonResponse({'Status': False, 'Error': str(e)})
             else:
-                stream = get(url).content
-
-                data = load_yaml(stream, Loader=Loader)
-
-                shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=request.user.id)
-                for category in data['categories']:
-                    category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                    category_object.shops.add(shop.id)
-                    category_object.save()
-                ProductInfo.objects.filter(shop_id=shop.id).delete()
-                for item in data['goods']:
-                    product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-                    product_info = ProductInfo.objects.create(product_id=product.id,
-                                                              external_id=item['id'],
-                                                              model=item['model'],
-                                                              price=item['price'],
-                                                              price_rrc=item['price_rrc'],
-                                                              quantity=item['quantity'],
-                                                              shop_id=shop.id)
-                    for name, value in item['parameters'].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_info_id=product_info.id,
-                                                        parameter_id=parameter_object.id,
-                                                        value=value)
+                job = ImportJob.objects.create(user_id=request.user.id, url=url)
+                # запись задачи уже зафиксирована (view работает в autocommit); если брокер
+                # недоступен, задача помечается ошибочной, иначе она навсегда осталась бы в очереди
+                try:
+                    do_import.delay(job.id)
+                except Exception as error:
+                    job.state = 'failed'
+                    job.errors = f'Не удалось поставить импорт в очередь: {error}'
+                    job.finished_at = timezone.now()
+                    job.save(update_fields=['state', 'errors', 'finished_at'])
+                    return JsonResponse({'Status': False, 'Errors': job.errors, 'Job': job.id})
 
-                return JsonResponse({'Status': True})
+                return JsonResponse({'Status': True, 'Job': job.id})
 
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+class PartnerUpdateStatus(APIView):
+    """
+    A class for tracking partner price list import jobs.
+
+    Methods:
+    - get: Retrieve the state of an import job.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request, job_id, *args, **kwargs):
+        """
+                Retrieve the progress, row counts and errors of an import job.
+
+                Args:
+                - request (Request): The Django request object.
+                - job_id (int): The import job identifier.
+
+                Returns:
+                - Response: The response containing the import job state.
+                """
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
+
+        job = ImportJob.objects.filter(id=job_id, user_id=request.user.id).first()
+        if not job:
+            return JsonResponse({'Status': False, 'Errors': 'Задача импорта не найдена'}, status=404)
+
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+
 class PartnerState(APIView):
     """
        A class for managing partner state.
@@ -510,7 +687,10 @@ class PartnerState(APIView):
         state = request.data.get('state')
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                with transaction.atomic():
+                    Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                    for shop_id in Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True):
+                        invalidate_on_commit(shop_scopes(shop_id))
                 return JsonResponse({'Status': True})
             except ValueError as error:
                 return JsonResponse({'Status': False, 'Errors': str(error)})
@@ -536,7 +716,8 @@ class PartnerOrders(APIView):
                - request (Request): The Django request object.
 
                Returns:
-               - Response: The response containing the orders associated with the partner.
+               - Response: The response containing the orders associated with the partner, limited to the
+                 partner's own items and their subtotal (streamed as a JSON array when ?stream=1 is passed).
                """
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
@@ -544,13 +725,19 @@ class PartnerOrders(APIView):
         if request.user.type != 'shop':
             return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
 
-        order = Order.objects.filter(
-            ordered_items__product_info__shop__user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+        # позиции заказа только этого магазина
+        ordered_items = OrderItem.objects.filter(
+            product_info__shop__user_id=request.user.id).select_related(
+            'product_info__product__category').prefetch_related(
+            'product_info__product_parameters__parameter')
+        order = ShopOrder.objects.filter(
+            shop__user_id=request.user.id).select_related('order__contact').prefetch_related(
+            Prefetch('order__ordered_items', queryset=ordered_items, to_attr='shop_items'))
+
+        if is_streaming(request):
+            return StreamingJsonResponse(order, ShopOrderFastSerializer)
 
-        serializer = OrderSerializer(order, many=True)
+        serializer = ShopOrderFastSerializer(order, many=True)
         return Response(serializer.data)
 
 
@@ -693,23 +880,26 @@ class OrderView(APIView):
                - request (Request): The Django request object.
 
                Returns:
-               - Response: The response containing the details of the order.
+               - Response: The response containing the details of the order
+                 (streamed as a JSON array when ?stream=1 is passed).
                """
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
         order = Order.objects.filter(
             user_id=request.user.id).exclude(state='basket').prefetch_related(
             'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+            'ordered_items__product_info__product_parameters__parameter').select_related('contact')
 
-        serializer = OrderSerializer(order, many=True)
+        if is_streaming(request):
+            return StreamingJsonResponse(order, OrderFastSerializer)
+
+        serializer = OrderFastSerializer(order, many=True)
         return Response(serializer.data)
 
     # разместить заказ из корзины
     def post(self, request, *args, **kwargs):
         """
-               Put an order and send a notification.
+               Put an order from the basket, reserve its items in stock and send a notification.
 
                Args:
                - request (Request): The Django request object.
@@ -722,17 +912,156 @@ class OrderView(APIView):
 
         if {'id', 'contact'}.issubset(request.data):
             if request.data['id'].isdigit():
+                order_id = int(request.data['id'])
                 try:
-                    is_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data['id']).update(
-                        contact_id=request.data['contact'],
-                        state='new')
+                    with transaction.atomic():
+                        is_updated = Order.objects.filter(
+                            user_id=request.user.id, id=order_id, state='basket').update(
+                            contact_id=request.data['contact'],
+                            state='new')
+                        if is_updated:
+                            Order.reserve_stock(order_id)
+                            ShopOrder.refresh(order_id)
+                            invalidate_on_commit(order_scopes(order_id))
                 except IntegrityError as error:
                     print(error)
                     return JsonResponse({'Status': False, 'Errors': 'Неправильно указаны аргументы'})
+                except OutOfStock as error:
+                    return JsonResponse({'Status': False, 'Errors': 'Недостаточно товара на складе',
+                                             'product_info': error.product_info_id})
                 else:
                     if is_updated:
                         new_order.send(sender=self.__class__, user_id=request.user.id)
                         return JsonResponse({'Status': True})
 
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+
+
+class ProfileList(APIView):
+    """
+    A class for listing saved request profiles. Available to staff only.
+
+    Methods:
+    - get: Retrieve the saved profiles, newest first.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+               Retrieve the saved profiles, newest first.
+
+               Args:
+               - request (Request): The Django request object.
+
+               Returns:
+               - Response: The response containing the id, request and phase durations of each profile.
+               """
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if not request.user.is_staff:
+            return JsonResponse({'Status': False, 'Error': 'Только для персонала'}, status=403)
+
+        return Response(list_profiles())
+
+
+class ProfileDetail(APIView):
+    """
+    A class for retrieving a saved request profile. Available to staff only.
+
+    Methods:
+    - get: Retrieve the profile report.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request, profile_id, *args, **kwargs):
+        """
+               Retrieve the profile report: the top functions and memory peak of each phase and the largest
+               memory allocations.
+
+               Args:
+               - request (Request): The Django request object.
+               - profile_id (str): The profile identifier.
+
+               Returns:
+               - Response: The response containing the profile report.
+               """
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if not request.user.is_staff:
+            return JsonResponse({'Status': False, 'Error': 'Только для персонала'}, status=403)
+
+        profile = get_profile(profile_id)
+        if not profile:
+            return JsonResponse({'Status': False, 'Errors': 'Профиль не найден'}, status=404)
+        return Response(profile)
+
+
+class ProfileStats(APIView):
+    """
+    A class for downloading the raw cProfile data of a profile phase. Available to staff only.
+
+    Methods:
+    - get: Download the pstats file.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request, profile_id, phase, *args, **kwargs):
+        """
+               Download the pstats file of a profile phase (view or render), readable by pstats or snakeviz.
+
+               Args:
+               - request (Request): The Django request object.
+               - profile_id (str): The profile identifier.
+               - phase (str): The profile phase.
+
+               Returns:
+               - FileResponse: The pstats file.
+               """
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if not request.user.is_staff:
+            return JsonResponse({'Status': False, 'Error': 'Только для персонала'}, status=403)
+
+        path = get_profile_stats_path(profile_id, phase)
+        if not path:
+            return JsonResponse({'Status': False, 'Errors': 'Профиль не найден'}, status=404)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.{phase}.prof',
+                            content_type='application/octet-stream')
+
+
+class MetricsView(APIView):
+    """
+    A class for exposing service metrics in the Prometheus text format.
+
+    Methods:
+    - get: Retrieve the metrics.
+
+    Attributes:
+    - authentication_classes: The scraper authenticates with METRICS_TOKEN instead of a user token.
+    """
+    authentication_classes = []
+
+    def get(self, request, *args, **kwargs):
+        """
+               Retrieve request latency histograms and counters, import, email and cache metrics.
+
+               Args:
+               - request (Request): The Django request object.
+
+               Returns:
+               - HttpResponse: The metrics in the Prometheus text format.
+               """
+        if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+            return JsonResponse({'Status': False, 'Error': 'Неверный токен'}, status=403)
+
+        content, content_type = export_metrics()
+        return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,18 @@
+"""
+Celery application for netology_pd_diplom project.
+
+Start a worker with:
+    celery -A netology_pd_diplom worker -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'netology_pd_diplom.settings')
+
+app = Celery('netology_pd_diplom')
+
+# настройки с префиксом CELERY_ берутся из settings.py
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()